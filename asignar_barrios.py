@@ -1,6 +1,13 @@
+import numpy as np
 import pandas as pd
 import geopandas as gpd
+import shapely
+from pyproj import CRS, Transformer
+import os
 import sys
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # ==========================================
@@ -9,6 +16,18 @@ from pathlib import Path
 ARCHIVO_REVIEWS = 'reviews_neuquen.csv'
 ARCHIVO_BARRIOS = Path(__file__).with_name('shapeBarrios.json')
 
+# Cache local del mapa de barrios (GeoParquet, en Web Mercator)
+CACHE_DIR = Path('~/.cache/que-morfamos').expanduser()
+CACHE_BARRIOS = CACHE_DIR / 'barrios_3857.parquet'
+CACHE_MAX_EDAD_SEG = 7 * 24 * 3600
+
+# Puntos por bloque al consultar el STRtree en paralelo
+CHUNK_CRUCE = 50_000
+
+# CRS del shapefile (Web Mercator) y transformador GPS -> Web Mercator, creados una sola vez
+CRS_WEB_MERC = CRS.from_epsg(3857)
+GPS_A_WEB_MERC = Transformer.from_crs(4326, CRS_WEB_MERC, always_xy=True)
+
 # Mapeo de Zonas (Definido globalmente para ser importable)
 ZONAS_MAP = {
     # CENTRO
@@ -71,33 +90,100 @@ ZONAS_MAP = {
     'NUEVO': 'Oeste'
 }
 
-BARRIOS_RIO = ['RÍO GRANDE', 'LIMAY', 'CONFLUENCIA RURAL', 'RINCÓN DE EMILIO', 'VALENTINA SUR RURAL']
+BARRIOS_RIO = frozenset({'RÍO GRANDE', 'LIMAY', 'CONFLUENCIA RURAL', 'RINCÓN DE EMILIO', 'VALENTINA SUR RURAL'})
+
+
+def normalizar_barrio(nombre):
+    """Mayúsculas y sin tildes, para que el NOMBRE del shapefile coincida con ZONAS_MAP."""
+    if not nombre:
+        return nombre
+    sin_tildes = unicodedata.normalize('NFKD', nombre).encode('ascii', 'ignore').decode('ascii')
+    return sin_tildes.upper().strip()
+
+
+# Versiones normalizadas (se construyen una sola vez al importar)
+ZONAS_MAP_NORM = {normalizar_barrio(k): v for k, v in ZONAS_MAP.items()}
+BARRIOS_RIO_NORM = frozenset(normalizar_barrio(b) for b in BARRIOS_RIO)
+# (zona, cerca_rio) por barrio normalizado: una sola búsqueda por punto
+BARRIO_META_NORM = {k: (v, k in BARRIOS_RIO_NORM) for k, v in ZONAS_MAP_NORM.items()}
+BARRIO_META_NORM.update({k: ('Otras Zonas', True) for k in BARRIOS_RIO_NORM - ZONAS_MAP_NORM.keys()})
+
+
+def _cache_barrios_vigente():
+    """El cache sirve si existe, tiene menos de 7 días y es más nuevo que el shapefile."""
+    if not CACHE_BARRIOS.exists():
+        return False
+    mtime_cache = CACHE_BARRIOS.stat().st_mtime
+    if time.time() - mtime_cache > CACHE_MAX_EDAD_SEG:
+        return False
+    if ARCHIVO_BARRIOS.exists() and ARCHIVO_BARRIOS.stat().st_mtime > mtime_cache:
+        return False
+    return True
+
+
+def _con_clave_barrio(gdf_barrios):
+    """Agrega la columna barrio_key (nombre normalizado) usada para mapear zonas."""
+    gdf_barrios['barrio_key'] = gdf_barrios['barrio_oficial'].map(normalizar_barrio)
+    return gdf_barrios
+
 
 def load_barrios():
+    if _cache_barrios_vigente():
+        try:
+            gdf_barrios = gpd.read_parquet(CACHE_BARRIOS)
+            print("📦 Mapa de barrios cargado desde cache local")
+            return _con_clave_barrio(gdf_barrios)
+        except Exception as e:
+            print(f"   ⚠️ Cache de barrios inválido, se regenera: {e}")
+
     print("📄 Leyendo mapa de barrios de Neuquén desde archivo local...")
     if not ARCHIVO_BARRIOS.exists():
         print(f"   ❌ No existe el archivo: {ARCHIVO_BARRIOS}")
         sys.exit(1)
 
     try:
-        gdf_barrios = gpd.read_file(ARCHIVO_BARRIOS)
+        gdf_barrios = gpd.read_file(ARCHIVO_BARRIOS, engine="pyogrio")
         print("   ✅ Mapa cargado")
     except Exception as e:
         print(f"   ❌ Error leyendo mapa: {e}")
         sys.exit(1)
 
     # ¡IMPORTANTE! Definimos que el archivo viene en "Web Mercator" (Metros)
-    gdf_barrios.set_crs(epsg=3857, inplace=True, allow_override=True)
-    # Lo convertimos a Latitud/Longitud (EPSG:4326) para que coincida con el GPS
-    gdf_barrios = gdf_barrios.to_crs(epsg=4326)
+    # No se reproyectan los polígonos: se proyectan los puntos (muchos menos vértices)
+    if gdf_barrios.crs != CRS_WEB_MERC:
+        gdf_barrios.set_crs(CRS_WEB_MERC, inplace=True, allow_override=True)
     # Nos quedamos solo con lo útil y renombramos para claridad
     gdf_barrios = gdf_barrios[['NOMBRE', 'geometry']].rename(columns={'NOMBRE': 'barrio_oficial'})
-    return gdf_barrios
+
+    # Guardar cache para las próximas corridas
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        gdf_barrios.to_parquet(CACHE_BARRIOS)
+    except Exception as e:
+        print(f"   ⚠️ No se pudo guardar cache de barrios: {e}")
+    return _con_clave_barrio(gdf_barrios)
+
+
+def _consultar_within(gdf_barrios, puntos):
+    """
+    Consulta qué polígono contiene cada punto. Para volúmenes grandes divide en bloques
+    y los consulta en hilos: GEOS libera el GIL durante query, así que escala con los núcleos.
+    """
+    sindex = gdf_barrios.sindex
+    if len(puntos) <= CHUNK_CRUCE:
+        return sindex.query(puntos, predicate="within")
+
+    inicios = list(range(0, len(puntos), CHUNK_CRUCE))
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+        partes = list(pool.map(lambda i: sindex.query(puntos[i:i + CHUNK_CRUCE], predicate="within"), inicios))
+    idx_puntos = np.concatenate([parte[0] + inicio for parte, inicio in zip(partes, inicios)])
+    idx_barrios = np.concatenate([parte[1] for parte in partes])
+    return idx_puntos, idx_barrios
 
 
 def process_supabase(gdf_barrios):
-    from db_utils import get_connection
-    import psycopg2
+    from db_utils import get_connection, close_connection
+    from psycopg2.extras import execute_values
     
     print("\n🐘 Conectando a Supabase...")
     conn = get_connection()
@@ -112,64 +198,109 @@ def process_supabase(gdf_barrios):
             FROM lugares 
             WHERE latitud IS NOT NULL AND longitud IS NOT NULL
         """
-        df_lugares = pd.read_sql(query, conn)
+        # Tipos explícitos: las coordenadas llegan directo como float64 (no como Decimal/object)
+        df_lugares = pd.read_sql(query, conn, dtype={'latitud': 'float64', 'longitud': 'float64'})
         print(f"   📊 Lugares cargados: {len(df_lugares)}")
         
         if df_lugares.empty:
             print("   ⚠️ No hay lugares con coordenadas para procesar.")
             return
 
-        # Convertir a GeoDataFrame
-        gdf_lugares = gpd.GeoDataFrame(
-            df_lugares,
-            geometry=gpd.points_from_xy(df_lugares.longitud, df_lugares.latitud),
-            crs="EPSG:4326"
-        )
+        # Descartar coordenadas NaN (NUMERIC 'NaN' pasa el filtro IS NOT NULL) con una sola máscara
+        lat = df_lugares['latitud'].to_numpy()
+        lon = df_lugares['longitud'].to_numpy()
+        validos = ~(np.isnan(lat) | np.isnan(lon))
+        if not validos.all():
+            df_lugares = df_lugares.iloc[validos]
+            lat, lon = lat[validos], lon[validos]
         
-        # Spatial Join
+        # Puntos GPS (EPSG:4326) proyectados a Web Mercator para cruzar con los polígonos
+        x, y = GPS_A_WEB_MERC.transform(lon, lat)
+        
+        # Prefiltro barato: solo consultan el STRtree los puntos dentro del bbox total de la ciudad
+        minx, miny, maxx, maxy = gdf_barrios.total_bounds
+        pos_bbox = np.flatnonzero((x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy))
+        puntos = shapely.points(x[pos_bbox], y[pos_bbox])
+        
+        # Cruce espacial: consulta directa al STRtree (evita el merge/reindex de sjoin)
         print("🗺️  Realizando cruce espacial...")
-        resultado = gpd.sjoin(gdf_lugares, gdf_barrios, how="left", predicate="within")
+        idx_lugar, idx_barrio = _consultar_within(gdf_barrios, puntos)
+        idx_lugar = pos_bbox[idx_lugar]  # Volver a posiciones de df_lugares
+        barrio_oficial = pd.Series(None, index=df_lugares.index, dtype=object)
+        barrio_oficial.iloc[idx_lugar] = gdf_barrios['barrio_oficial'].values[idx_barrio]
+        barrio_key = pd.Series(None, index=df_lugares.index, dtype=object)
+        barrio_key.iloc[idx_lugar] = gdf_barrios['barrio_key'].values[idx_barrio]
+        # Solo las columnas que usan los pasos siguientes (sin coordenadas)
+        resultado = df_lugares[['nombre', 'barrio_actual', 'zona_actual']].assign(barrio_oficial=barrio_oficial)
         
-        # Asignar Zonas
-        resultado['zona_nueva'] = resultado['barrio_oficial'].map(ZONAS_MAP).fillna('Otras Zonas')
+        # Asignar Zonas: categórico sobre las claves normalizadas de ZONAS_MAP.
+        # El código -1 (barrio desconocido o sin barrio) cae en 'Otras Zonas'.
+        clave_cat = pd.Categorical(barrio_key, categories=list(ZONAS_MAP_NORM))
+        zonas_por_codigo = np.array(list(ZONAS_MAP_NORM.values()) + ['Otras Zonas'], dtype=object)
+        resultado['zona_nueva'] = zonas_por_codigo[clave_cat.codes]
         
-        # Lógica extra: Cerca del Río
-        resultado['cerca_rio'] = resultado['barrio_oficial'].isin(BARRIOS_RIO)
+        desconocidos = barrio_key[barrio_key.notna() & (clave_cat.codes == -1)].unique()
+        if len(desconocidos):
+            print(f"   ⚠️ Barrios sin zona en ZONAS_MAP: {', '.join(desconocidos)}")
+        
+        # Lógica extra: Cerca del Río (comparación sobre códigos enteros del categórico)
+        codigos_rio = np.flatnonzero(clave_cat.categories.isin(list(BARRIOS_RIO_NORM)))
+        resultado['cerca_rio'] = np.isin(clave_cat.codes, codigos_rio)
+        
+        # Detectar cambios de forma vectorizada (sin evaluar fila por fila en Python)
+        resultado['barrio_oficial'] = resultado['barrio_oficial'].astype(object).where(resultado['barrio_oficial'].notna(), None)
+        hay_cambio = (
+            resultado['barrio_oficial'].fillna('').ne(resultado['barrio_actual'].fillna(''))
+            | resultado['zona_nueva'].ne(resultado['zona_actual'].fillna(''))
+        )
+        a_actualizar = resultado[hay_cambio]
         
         # Update en Batch - Solo si hay cambios reales
         print("💾 Actualizando base de datos...")
         cursor = conn.cursor()
         
-        updates = 0
         cambios = []
+        filas = []
         
-        for idx, row in resultado.iterrows():
-            nombre = row['nombre']
-            barrio_nuevo = row['barrio_oficial'] if pd.notna(row['barrio_oficial']) else None
-            zona_nueva = row['zona_nueva']
-            cerca_rio = bool(row['cerca_rio'])
+        columnas = ['nombre', 'barrio_oficial', 'zona_nueva', 'cerca_rio', 'barrio_actual', 'zona_actual']
+        for nombre, barrio_nuevo, zona_nueva, cerca_rio, barrio_actual, zona_actual in a_actualizar[columnas].itertuples(index=False, name=None):
+            cerca_rio = bool(cerca_rio)
             
-            barrio_actual = row.get('barrio_actual')
-            zona_actual = row.get('zona_actual')
+            filas.append((nombre, barrio_nuevo, zona_nueva, cerca_rio))
             
-            # Solo actualizar si hay cambios reales
-            if barrio_nuevo != barrio_actual or zona_nueva != zona_actual:
-                sql = """
-                    UPDATE lugares 
-                    SET barrio = %s, zona = %s, cerca_rio = %s 
-                    WHERE nombre = %s
-                """
-                cursor.execute(sql, (barrio_nuevo, zona_nueva, cerca_rio, nombre))
-                updates += 1
-                
-                # Registrar el cambio
-                cambios.append({
-                    'nombre': nombre,
-                    'barrio_antes': barrio_actual or '(vacío)',
-                    'barrio_despues': barrio_nuevo or '(vacío)',
-                    'zona_antes': zona_actual or '(vacío)',
-                    'zona_despues': zona_nueva
-                })
+            # Registrar el cambio
+            cambios.append({
+                'nombre': nombre,
+                'barrio_antes': barrio_actual or '(vacío)',
+                'barrio_despues': barrio_nuevo or '(vacío)',
+                'zona_antes': zona_actual or '(vacío)',
+                'zona_despues': zona_nueva
+            })
+        
+        if filas:
+            # Un solo round-trip: cargar cambios en tabla temporal y actualizar con JOIN
+            cursor.execute("""
+                CREATE TEMP TABLE _upd_barrios (
+                    nombre TEXT, barrio TEXT, zona TEXT, cerca_rio BOOLEAN
+                ) ON COMMIT DROP
+            """)
+            execute_values(cursor, "INSERT INTO _upd_barrios VALUES %s", filas, page_size=1000)
+            cursor.execute("""
+                UPDATE lugares l
+                SET barrio = u.barrio, zona = u.zona, cerca_rio = u.cerca_rio
+                FROM _upd_barrios u
+                WHERE l.nombre = u.nombre
+            """)
+        updates = len(filas)
+        
+        # Reseñas con/sin barrio (vía su lugar), para la notificación del workflow
+        cursor.execute("""
+            SELECT COUNT(*) FILTER (WHERE l.barrio IS NOT NULL),
+                   COUNT(*) FILTER (WHERE l.barrio IS NULL)
+            FROM reviews r
+            LEFT JOIN lugares l ON l.id = r.lugar_id
+        """)
+        con_barrio, sin_barrio = cursor.fetchone()
             
         conn.commit()
         cursor.close()
@@ -186,16 +317,21 @@ def process_supabase(gdf_barrios):
                 print(f"   ... y {len(cambios) - 20} más")
         
         print(f"\n   ✅ {updates} lugares actualizados en Supabase.")
+        print(f"   🏘️ Reseñas con barrio: {con_barrio}")
+        print(f"   ❓ Reseñas sin barrio: {sin_barrio}")
         
     except Exception as e:
         print(f"❌ Error procesando Supabase: {e}")
         conn.rollback()
     finally:
-        conn.close()
+        # Devuelve la conexión al pool y lo cierra
+        close_connection()
 
 def main():
     # Ya no hay argumentos, siempre va a Supabase
     gdf_barrios = load_barrios()
+    # Construir el índice espacial (STRtree) una sola vez; el cruce lo reutiliza
+    _ = gdf_barrios.sindex
     process_supabase(gdf_barrios)
 
 if __name__ == "__main__":
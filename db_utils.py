@@ -2,15 +2,64 @@
 Módulo de utilidades para conexión a Supabase/PostgreSQL.
 Proporciona funciones para insertar reviews y gestionar estado de procesamiento.
 """
+import io
 import os
+import csv
+import atexit
 import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-# Variable global para la conexión
+# Pool de conexiones (se crea al primer uso) y conexión de sesión para scripts
+_pool = None
+_pool_lock = threading.Lock()
 _connection = None
 
+# Huella de deduplicación de reviews: md5 de los primeros 50 caracteres del texto
+# normalizado (minúsculas, espacios colapsados). Se calcula siempre en Postgres
+# (columna generada reviews.texto_fp y _huellas_lote): lower() y \s dependen del
+# lc_ctype de la base, así que una versión en Python no coincidiría siempre.
+_TEXTO_FP_SQL = r"md5(left(btrim(regexp_replace(lower(left(coalesce(texto, ''), 100)), '\s+', ' ', 'g')), 50))"
+# La columna y el índice único los crea migracion_dedup_reviews.sql; en ejecución
+# solo se consulta el catálogo, una vez por proceso
+_dedup_verificado = False
+_texto_fp_listo = False
+# True si existe el índice único (restaurante, autor, texto_fp): la deduplicación
+# la resuelve el INSERT ... ON CONFLICT sin consultar antes las huellas existentes
+_dedup_unico = False
+
+# Las tablas summary_cache, clasificacion_cache y categoria_lugar_cache se crean al primer uso
+_summary_cache_listo = False
+_clasificacion_cache_lista = False
+_categoria_lugar_cache_lista = False
+
+# Días durante los que la categoría extraída de un lugar se reutiliza sin volver a Google Maps
+CATEGORIA_LUGAR_TTL_DIAS = 30
+
+# Buffer de eventos para scraping_logs: se vuelca en lote por tamaño, por tiempo o al salir
+LOG_BUFFER_MAX = 500
+LOG_FLUSH_SEG = 30
+_log_buffer = deque(maxlen=10_000)
+_log_lock = threading.Lock()
+_log_ultimo_flush = time.monotonic()
+
+# Horas tras las que vence el reclamo de un lugar por un worker del monitor
+MONITOR_RECLAMO_HORAS = 6
+_reclamo_listo = False
+
+# A partir de este tamaño de lote, insertar_reviews_batch usa COPY (bulk_insert_reviews)
+BULK_COPY_MIN = 5000
+
+# Las tablas de logs/historial toleran perder la última escritura ante una caída del
+# servidor: no esperar el flush del WAL en el COMMIT. Se antepone en el mismo execute()
+# para no sumar un round-trip.
+_SIN_ESPERA_WAL = "SET LOCAL synchronous_commit TO OFF;"
+
 def get_database_url():
     """Obtiene la URL de la base de datos desde variables de entorno."""
     url = os.getenv("DATABASE_URL")
@@ -20,54 +69,120 @@ def get_database_url():
     return url
 
 
-def get_connection():
-    """Obtiene o crea una conexión a PostgreSQL."""
-    global _connection
+def _get_pool():
+    """Obtiene o crea el pool de conexiones (thread-safe)."""
+    global _pool
+    if _pool is not None:
+        return _pool
     
     database_url = get_database_url()
     if not database_url:
         return None
     
-    if _connection is not None:
-        try:
-            # Verificar que la conexión sigue activa
-            cursor = _connection.cursor()
-            cursor.execute("SELECT 1")
-            cursor.close()
-            return _connection
-        except:
-            _connection = None
+    with _pool_lock:
+        if _pool is None:
+            try:
+                from psycopg2.pool import ThreadedConnectionPool
+                # Keepalives TCP en lugar de hacer ping con SELECT 1 en cada uso
+                _pool = ThreadedConnectionPool(
+                    minconn=1,
+                    maxconn=int(os.getenv("PG_POOL_MAX", 10)),
+                    dsn=database_url,
+                    keepalives=1,
+                    keepalives_idle=30,
+                    keepalives_interval=10,
+                    keepalives_count=5
+                )
+                logger.info("✅ Pool de conexiones a PostgreSQL creado")
+            except ImportError:
+                logger.error("❌ psycopg2 no instalado. Ejecutar: pip install psycopg2-binary")
+                return None
+            except Exception as e:
+                logger.error(f"❌ Error conectando a PostgreSQL: {e}")
+                return None
+    return _pool
+
+
+@contextmanager
+def borrow_conn():
+    """
+    Presta una conexión del pool y la devuelve al salir.
+    Entrega None si no hay base de datos configurada o disponible.
+    """
+    pool = _get_pool()
+    if pool is None:
+        yield None
+        return
+    
+    try:
+        conn = pool.getconn()
+    except Exception as e:
+        logger.error(f"❌ No se pudo obtener conexión del pool: {e}")
+        yield None
+        return
     
     try:
-        import psycopg2
-        _connection = psycopg2.connect(database_url)
+        yield conn
+    finally:
+        if conn.closed:
+            pool.putconn(conn, close=True)
+        else:
+            try:
+                # Descartar cualquier transacción que haya quedado abierta
+                conn.rollback()
+            except:
+                pass
+            pool.putconn(conn)
+
+
+def get_connection():
+    """
+    Obtiene una conexión persistente para scripts que la usan directamente
+    (pd.read_sql, consultas ad-hoc). Se devuelve al pool con close_connection().
+    """
+    global _connection
+    
+    if _connection is not None and not _connection.closed:
+        return _connection
+    
+    pool = _get_pool()
+    if pool is None:
+        return None
+    
+    try:
+        _connection = pool.getconn()
         _connection.autocommit = False
         logger.info("✅ Conexión a PostgreSQL establecida")
         return _connection
-    except ImportError:
-        logger.error("❌ psycopg2 no instalado. Ejecutar: pip install psycopg2-binary")
-        return None
     except Exception as e:
         logger.error(f"❌ Error conectando a PostgreSQL: {e}")
+        _connection = None
         return None
 
 
 def close_connection():
-    """Cierra la conexión a la base de datos."""
-    global _connection
-    if _connection:
+    """Guarda los eventos pendientes, devuelve la conexión de sesión y cierra el pool."""
+    global _connection, _pool
+    if _pool:
+        flush_logs()
         try:
-            _connection.close()
+            if _connection is not None:
+                _pool.putconn(_connection, close=True)
+            _pool.closeall()
             logger.info("✅ Conexión a PostgreSQL cerrada")
         except:
             pass
-        _connection = None
+    _connection = None
+    _pool = None
 
 
 def _simplificar_direccion(direccion):
     """
     Retorna la primera parte de la dirección (antes de la coma).
     Ej: 'Eugenio Perticone 545, Q8300 Neuquén' -> 'Eugenio Perticone 545'
+    
+    upsert_lugar calcula lo mismo en SQL (btrim(split_part(direccion, ',', 1)));
+    este helper queda para usos fuera de la base de datos.
     """
     if not direccion:
         return ""
@@ -77,131 +192,164 @@ def upsert_lugar(lugar_data):
     """
     Inserta o actualiza un lugar en la tabla 'lugares'.
     Maneja duplicados de nombre agregando la dirección simplificada.
+    
+    La desambiguación y el upsert van en una sola sentencia (CTE): se detectan
+    los lugares con el mismo nombre y otra URL, se les agrega su dirección
+    simplificada y se inserta el actual con la suya (todo calculado en el servidor).
     """
-    conn = get_connection()
-    if not conn:
-        return False
+    with borrow_conn() as conn:
+        if not conn:
+            return False
     
-    try:
-        cursor = conn.cursor()
-        
-        raw_nombre = lugar_data.get('nombre') or lugar_data.get('restaurante', 'Desconocido')
-        url = lugar_data.get('url')
-        direccion = lugar_data.get('direccion')
-        
-        # --- Lógica de Desambiguación de Nombres ---
-        if direccion: # Solo podemos desambiguar si hay dirección
-            # Buscar otros lugares con el mismo nombre y distinta URL
-            cursor.execute("SELECT url, direccion, nombre FROM lugares WHERE nombre = %s AND url != %s", (raw_nombre, url))
-            collisions = cursor.fetchall()
-            
-            if collisions:
-                logger.info(f"⚠️ Detectada colisión de nombre para '{raw_nombre}' con {len(collisions)} lugares.")
-                
-                # 1. Modificar nombre del actual
-                simp_dir_actual = _simplificar_direccion(direccion)
-                nuevo_nombre_actual = f"{raw_nombre} - {simp_dir_actual}"
-                lugar_data['nombre'] = nuevo_nombre_actual # Actualizamos para el insert abajo
-                # logger.info(f"   -> Nombre ajustado a: {nuevo_nombre_actual}")
-                
-                # 2. Corregir los existentes mal nombrados (si aún tienen el nombre genérico)
-                for col_url, col_dir, col_nom in collisions:
-                    if col_nom == raw_nombre and col_dir: # Solo si se llaman igual exactamente
-                        simp_dir_col = _simplificar_direccion(col_dir)
-                        nuevo_nombre_col = f"{raw_nombre} - {simp_dir_col}"
-                        try:
-                            # Actualización recursiva ligera
-                            cursor.execute("UPDATE lugares SET nombre = %s WHERE url = %s", (nuevo_nombre_col, col_url))
-                            logger.info(f"   -> Corrigiendo nombre existente: {nuevo_nombre_col}")
-                            
-                            # También actualizar el historial para mantener consistencia? 
-                            # Podría ser costoso, dejémoslo para lugares.
-                        except Exception as e:
-                            logger.warning(f"Error corrigiendo colisión {col_url}: {e}")
+        try:
+            cursor = conn.cursor()
         
-        # --- Fin Lógica Desambiguación ---
-
-        query = """
-            INSERT INTO lugares (
-                nombre, categoria, rating_gral, total_reviews_google, 
-                direccion, latitud, longitud, url, 
-                barrio, zona, cerca_rio,
-                fecha_scraping
-            ) VALUES (
-                %(nombre)s, %(categoria)s, %(rating_gral)s, %(total_reviews_google)s, 
-                %(direccion)s, %(latitud)s, %(longitud)s, %(url)s, 
-                %(barrio)s, %(zona)s, %(cerca_rio)s,
-                NOW()
-            )
-            ON CONFLICT (url) DO UPDATE SET
-                nombre = EXCLUDED.nombre,
-                categoria = COALESCE(EXCLUDED.categoria, lugares.categoria),
-                rating_gral = COALESCE(EXCLUDED.rating_gral, lugares.rating_gral),
-                total_reviews_google = GREATEST(lugares.total_reviews_google, EXCLUDED.total_reviews_google),
-                direccion = COALESCE(EXCLUDED.direccion, lugares.direccion),
-                latitud = COALESCE(EXCLUDED.latitud, lugares.latitud),
-                longitud = COALESCE(EXCLUDED.longitud, lugares.longitud),
-                barrio = COALESCE(EXCLUDED.barrio, lugares.barrio),
-                zona = COALESCE(EXCLUDED.zona, lugares.zona),
-                cerca_rio = COALESCE(EXCLUDED.cerca_rio, lugares.cerca_rio),
-                fecha_scraping = NOW();
-        """
+            raw_nombre = lugar_data.get('nombre') or lugar_data.get('restaurante', 'Desconocido')
+            direccion = lugar_data.get('direccion')
+
+            query = """
+                WITH colisiones AS (
+                    -- Solo podemos desambiguar si hay dirección
+                    SELECT url, direccion FROM lugares
+                    WHERE COALESCE(%(direccion)s, '') <> ''
+                      AND nombre = %(nombre_base)s
+                      AND url != %(url)s
+                ),
+                corregidos AS (
+                    -- Corregir los existentes mal nombrados (si aún tienen el nombre genérico)
+                    UPDATE lugares l
+                    SET nombre = %(nombre_base)s || ' - ' || btrim(split_part(c.direccion, ',', 1))
+                    FROM colisiones c
+                    WHERE l.url = c.url AND COALESCE(c.direccion, '') <> ''
+                    RETURNING l.url
+                )
+                INSERT INTO lugares (
+                    nombre, categoria, rating_gral, total_reviews_google, 
+                    direccion, latitud, longitud, url, 
+                    barrio, zona, cerca_rio,
+                    fecha_scraping
+                ) VALUES (
+                    CASE WHEN EXISTS (SELECT 1 FROM colisiones)
+                         THEN %(nombre_base)s || ' - ' || btrim(split_part(%(direccion)s, ',', 1))
+                         ELSE %(nombre)s
+                    END,
+                    %(categoria)s, %(rating_gral)s, %(total_reviews_google)s, 
+                    %(direccion)s, %(latitud)s, %(longitud)s, %(url)s, 
+                    %(barrio)s, %(zona)s, %(cerca_rio)s,
+                    NOW()
+                )
+                ON CONFLICT (url) DO UPDATE SET
+                    nombre = EXCLUDED.nombre,
+                    categoria = COALESCE(EXCLUDED.categoria, lugares.categoria),
+                    rating_gral = COALESCE(EXCLUDED.rating_gral, lugares.rating_gral),
+                    total_reviews_google = GREATEST(lugares.total_reviews_google, EXCLUDED.total_reviews_google),
+                    direccion = COALESCE(EXCLUDED.direccion, lugares.direccion),
+                    latitud = COALESCE(EXCLUDED.latitud, lugares.latitud),
+                    longitud = COALESCE(EXCLUDED.longitud, lugares.longitud),
+                    barrio = COALESCE(EXCLUDED.barrio, lugares.barrio),
+                    zona = COALESCE(EXCLUDED.zona, lugares.zona),
+                    cerca_rio = COALESCE(EXCLUDED.cerca_rio, lugares.cerca_rio),
+                    fecha_scraping = NOW()
+                RETURNING nombre, (SELECT COUNT(*) FROM colisiones);
+            """
         
-        # Preparar datos (usando el nombre potencialmente modificado)
-        # Normalizar rating: convertir coma decimal a punto (ej: "4,0" -> "4.0")
-        rating_raw = lugar_data.get('rating_gral')
-        rating_normalizado = None
-        if rating_raw is not None:
-            try:
-                # Si es string, reemplazar coma por punto
-                if isinstance(rating_raw, str):
-                    rating_normalizado = float(rating_raw.replace(',', '.'))
-                else:
-                    rating_normalizado = float(rating_raw)
-            except (ValueError, TypeError):
-                rating_normalizado = None
+            # Normalizar rating: convertir coma decimal a punto (ej: "4,0" -> "4.0")
+            rating_raw = lugar_data.get('rating_gral')
+            rating_normalizado = None
+            if rating_raw is not None:
+                try:
+                    # Si es string, reemplazar coma por punto
+                    if isinstance(rating_raw, str):
+                        rating_normalizado = float(rating_raw.replace(',', '.'))
+                    else:
+                        rating_normalizado = float(rating_raw)
+                except (ValueError, TypeError):
+                    rating_normalizado = None
         
-        datos = {
-            'nombre': lugar_data.get('nombre'), # Ya fue actualizado arriba si hubo colisión
-            'categoria': lugar_data.get('categoria'),
-            'rating_gral': rating_normalizado,
-            'total_reviews_google': lugar_data.get('total_reviews_google', 0),
-            'direccion': lugar_data.get('direccion'),
-            'latitud': lugar_data.get('latitud'),
-            'longitud': lugar_data.get('longitud'),
-            'url': lugar_data.get('url'),
-            'barrio': lugar_data.get('barrio'),
-            'zona': lugar_data.get('zona'),
-            'cerca_rio': lugar_data.get('cerca_rio')
-        }
+            datos = {
+                'nombre': lugar_data.get('nombre'),
+                'nombre_base': raw_nombre,
+                'categoria': lugar_data.get('categoria'),
+                'rating_gral': rating_normalizado,
+                'total_reviews_google': lugar_data.get('total_reviews_google', 0),
+                'direccion': direccion,
+                'latitud': lugar_data.get('latitud'),
+                'longitud': lugar_data.get('longitud'),
+                'url': lugar_data.get('url'),
+                'barrio': lugar_data.get('barrio'),
+                'zona': lugar_data.get('zona'),
+                'cerca_rio': lugar_data.get('cerca_rio')
+            }
         
-        cursor.execute(query, datos)
-        conn.commit()
-        return True
+            cursor.execute(query, datos)
+            nombre_final, n_colisiones = cursor.fetchone()
+            conn.commit()
+            
+            if n_colisiones:
+                logger.info(f"⚠️ Detectada colisión de nombre para '{raw_nombre}' con {n_colisiones} lugares.")
+                lugar_data['nombre'] = nombre_final # Igual que antes: el llamador ve el nombre ajustado
+            return True
         
-    except Exception as e:
-        logger.error(f"❌ Error upsert lugar: {e}")
-        try:
-            conn.rollback()
-        except:
-            pass
-        return False
-    finally:
-        cursor.close()
+        except Exception as e:
+            logger.error(f"❌ Error upsert lugar: {e}")
+            try:
+                conn.rollback()
+            except:
+                pass
+            return False
+        finally:
+            cursor.close()
 
 
-def _obtener_lugar_id_por_nombre(cursor, nombre):
+def _huellas_lote(cursor, reviews_data):
     """
-    Busca el lugar_id a partir del nombre del restaurante.
-    Retorna None si no lo encuentra.
+    (autor normalizado, huella del texto) de cada review del lote, en orden, calculadas
+    en el servidor con las mismas expresiones que reviews (LOWER(TRIM(autor)), texto_fp).
     """
-    try:
-        cursor.execute("SELECT id FROM lugares WHERE nombre = %s LIMIT 1", (nombre,))
-        row = cursor.fetchone()
-        return row[0] if row else None
-    except Exception as e:
-        logger.warning(f"⚠️ Error buscando lugar_id para '{nombre}': {e}")
-        return None
+    cursor.execute(f"""
+        SELECT LOWER(TRIM(autor)), {_TEXTO_FP_SQL}
+        FROM unnest(%s::text[], %s::text[]) WITH ORDINALITY AS t(autor, texto, n)
+        ORDER BY n
+    """, (
+        [review.get('autor', '') or '' for review in reviews_data],
+        [review.get('texto') for review in reviews_data]
+    ))
+    return cursor.fetchall()
+
+
+def detectar_dedup_reviews():
+    """
+    Detecta si ya se corrió migracion_dedup_reviews.sql: columna reviews.texto_fp e
+    índice único (válido) de deduplicación. Solo lee el catálogo; sin DDL.
+    """
+    global _dedup_verificado, _texto_fp_listo, _dedup_unico
+    with borrow_conn() as conn:
+        if not conn:
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT
+                    EXISTS (
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_name = 'reviews' AND column_name = 'texto_fp'
+                    ),
+                    COALESCE((
+                        SELECT indisvalid FROM pg_index
+                        WHERE indexrelid = to_regclass('idx_reviews_dedup_fp_unico')
+                    ), FALSE)
+            """)
+            _texto_fp_listo, _dedup_unico = cursor.fetchone()
+            _dedup_verificado = True
+            if not _texto_fp_listo:
+                logger.warning("⚠️ reviews.texto_fp no existe: correr migracion_dedup_reviews.sql")
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"⚠️ Error verificando deduplicación de reviews: {e}")
+            return False
+        finally:
+            cursor.close()
 
 
 def insertar_reviews_batch(reviews_data):
@@ -209,112 +357,248 @@ def insertar_reviews_batch(reviews_data):
     Inserta un lote de reviews en la base de datos.
     Esquema: restaurante, review_id, autor, rating_user, texto, fecha_aproximada, fecha_original, fecha_scraping, lugar_id
     
-    Deduplicación: (restaurante + autor + texto_inicio)
+    Deduplicación: (restaurante + autor + huella del texto_inicio, ver texto_fp)
     Incluye lugar_id para relación formal con tabla lugares.
+    
+    Un INSERT multi-fila con execute_values; los duplicados los descarta el índice
+    único vía ON CONFLICT (o, si no existe, un único SELECT de huellas previo).
     """
     if not reviews_data:
         return 0, 0
     
-    conn = get_connection()
-    if not conn:
-        return 0, 0
+    if len(reviews_data) >= BULK_COPY_MIN:
+        return bulk_insert_reviews(reviews_data)
     
-    insertadas = 0
-    duplicadas = 0
-    # Cache para evitar buscar el mismo lugar_id múltiples veces
-    lugar_id_cache = {}
+    if not _dedup_verificado:
+        detectar_dedup_reviews()
     
-    try:
-        cursor = conn.cursor()
+    with borrow_conn() as conn:
+        if not conn:
+            return 0, 0
+    
+        from psycopg2.extras import execute_values
+    
+        insertadas = 0
+        duplicadas = 0
+    
+        try:
+            cursor = conn.cursor()
         
-        for review in reviews_data:
-            # Normalizar texto para comparación
-            texto_raw = review.get('texto', '') or ''
-            texto_norm = ' '.join(texto_raw[:100].lower().split())
-            autor_norm = (review.get('autor', '') or '').strip().lower()
-            restaurante = review.get('restaurante', '')
-            
-            # Obtener lugar_id (con cache para eficiencia)
-            if restaurante not in lugar_id_cache:
-                lugar_id_cache[restaurante] = _obtener_lugar_id_por_nombre(cursor, restaurante)
-            lugar_id = lugar_id_cache[restaurante]
-            
-            # Verificar si ya existe (sin usar URL, usando nombre de restaurante)
+            restaurantes = list({review.get('restaurante', '') for review in reviews_data})
+        
+            # lugar_id de todos los restaurantes del lote en una sola consulta
             cursor.execute("""
-                SELECT 1 FROM reviews 
-                WHERE restaurante = %s 
-                AND LOWER(TRIM(autor)) = %s 
-                AND LOWER(LEFT(texto, 100)) LIKE %s
-                LIMIT 1
-            """, (restaurante, autor_norm, texto_norm[:50] + '%'))
-            
-            if cursor.fetchone():
-                duplicadas += 1
-                continue
+                SELECT DISTINCT ON (nombre) nombre, id FROM lugares
+                WHERE nombre = ANY(%s)
+                ORDER BY nombre, id
+            """, (restaurantes,))
+            lugar_ids = dict(cursor.fetchall())
+        
+            # Con el índice único, ON CONFLICT descarta los duplicados (de la tabla y del
+            # propio lote). Sin él, se traen las huellas ya guardadas de los restaurantes
+            # del lote a un set (lookup O(1)); si la migración de texto_fp no pudo correr,
+            # se calcula la misma expresión al vuelo.
+            existentes = None
+            if not _dedup_unico:
+                columna_fp = 'texto_fp' if _texto_fp_listo else _TEXTO_FP_SQL
+                cursor.execute(f"""
+                    SELECT restaurante, LOWER(TRIM(autor)), {columna_fp}
+                    FROM reviews
+                    WHERE restaurante = ANY(%s)
+                """, (restaurantes,))
+                existentes = set(cursor.fetchall())
+                huellas = _huellas_lote(cursor, reviews_data)
+        
+            filas = []
+            for i, review in enumerate(reviews_data):
+                restaurante = review.get('restaurante', '')
+                
+                if existentes is not None:
+                    clave = (restaurante, *huellas[i])
+                
+                    # También deduplica dentro del mismo lote
+                    if clave in existentes:
+                        duplicadas += 1
+                        continue
+                    existentes.add(clave)
             
-            try:
-                # Insertar con lugar_id para relación formal
-                cursor.execute("""
+                filas.append((
+                    restaurante,
+                    review.get('autor', 'Anónimo'),
+                    review.get('rating_user'),
+                    review.get('texto', ''),
+                    review.get('fecha_aproximada'),
+                    review.get('fecha_original'),
+                    review.get('fecha_scraping', datetime.now().isoformat()),
+                    review.get('review_id', ''),
+                    lugar_ids.get(restaurante)
+                ))
+        
+            if filas:
+                insertadas_rows = execute_values(cursor, """
                     INSERT INTO reviews (
                         restaurante, autor, rating_user, texto, 
                         fecha_aproximada, fecha_original, 
                         fecha_scraping, review_id, lugar_id
-                    ) VALUES (
-                        %(restaurante)s, %(autor)s, %(rating_user)s, %(texto)s,
-                        %(fecha_aproximada)s, %(fecha_original)s,
-                        %(fecha_scraping)s, %(review_id)s, %(lugar_id)s
-                    )
-                """, {
-                    'restaurante': restaurante,
-                    'autor': review.get('autor', 'Anónimo'),
-                    'rating_user': review.get('rating_user'),
-                    'texto': review.get('texto', ''),
-                    'fecha_aproximada': review.get('fecha_aproximada'),
-                    'fecha_original': review.get('fecha_original'),
-                    'fecha_scraping': review.get('fecha_scraping', datetime.now().isoformat()),
-                    'review_id': review.get('review_id', ''),
-                    'lugar_id': lugar_id
-                })
-                
-                if cursor.rowcount > 0:
-                    insertadas += 1
-                else:
-                    duplicadas += 1
-                    
-            except Exception as e:
-                logger.warning(f"⚠️ Error insertando review: {e}")
-                duplicadas += 1
+                    ) VALUES %s
+                    ON CONFLICT DO NOTHING
+                    RETURNING 1
+                """, filas, page_size=500, fetch=True)
+                insertadas = len(insertadas_rows)
+                duplicadas += len(filas) - insertadas
         
-        conn.commit()
-        logger.info(f"✅ DB: {insertadas} insertadas, {duplicadas} duplicadas/skip")
+            conn.commit()
+            logger.info(f"✅ DB: {insertadas} insertadas, {duplicadas} duplicadas/skip")
         
-    except Exception as e:
-        logger.error(f"❌ Error en batch insert: {e}")
+        except Exception as e:
+            logger.error(f"❌ Error en batch insert: {e}")
+            insertadas = 0
+            try:
+                conn.rollback()
+            except:
+                pass
+        finally:
+            cursor.close()
+    
+    return insertadas, duplicadas
+
+
+# Marca de NULL en el CSV de COPY (ver _csv_copy_reviews)
+_COPY_NULL = '\\N'
+
+
+def _csv_copy_reviews(reviews_data):
+    r"""
+    CSV en memoria para COPY stg_reviews (FORMAT csv, NULL '\N').
+    None viaja como \N (NULL) y '' como campo vacío (texto vacío): con el NULL por
+    defecto de COPY un campo vacío sin comillas sería NULL y uno entre comillas '',
+    y el módulo csv no distingue None de '' al escribir.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for review in reviews_data:
+        fila = (
+            review.get('restaurante', ''),
+            review.get('autor', 'Anónimo'),
+            review.get('rating_user'),
+            review.get('texto', ''),
+            review.get('fecha_aproximada'),
+            review.get('fecha_original'),
+            review.get('fecha_scraping', datetime.now().isoformat()),
+            review.get('review_id', '')
+        )
+        writer.writerow(_COPY_NULL if valor is None else valor for valor in fila)
+    buffer.seek(0)
+    return buffer
+
+
+def bulk_insert_reviews(reviews_data):
+    """
+    Carga masiva de reviews (scrapeo inicial) vía COPY a una tabla temporal y luego
+    INSERT ... SELECT. Misma deduplicación que insertar_reviews_batch, toda en SQL:
+    la huella de cada fila se calcula tras el COPY y se descartan los repetidos del
+    lote (DISTINCT ON) y los ya guardados (NOT EXISTS sobre texto_fp).
+    """
+    if not reviews_data:
+        return 0, 0
+    
+    if not _dedup_verificado:
+        detectar_dedup_reviews()
+    if not _texto_fp_listo:
+        # Sin texto_fp no hay índice para el NOT EXISTS: usar el camino normal por lotes
+        resultados = [insertar_reviews_batch(reviews_data[i:i + BULK_COPY_MIN - 1])
+                      for i in range(0, len(reviews_data), BULK_COPY_MIN - 1)]
+        return sum(r[0] for r in resultados), sum(r[1] for r in resultados)
+    
+    with borrow_conn() as conn:
+        if not conn:
+            return 0, 0
+    
+        insertadas = 0
+        duplicadas = 0
+        
+        buffer = _csv_copy_reviews(reviews_data)
+    
         try:
-            conn.rollback()
-        except:
-            pass
-    finally:
-        cursor.close()
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                CREATE TEMP TABLE stg_reviews ON COMMIT DROP AS
+                SELECT restaurante, autor, rating_user, texto,
+                       fecha_aproximada, fecha_original, fecha_scraping,
+                       review_id, texto_fp
+                FROM reviews LIMIT 0
+            """)
+            cursor.copy_expert("""
+                COPY stg_reviews (
+                    restaurante, autor, rating_user, texto,
+                    fecha_aproximada, fecha_original, fecha_scraping, review_id
+                ) FROM STDIN WITH (FORMAT csv, NULL '\\N')
+            """, buffer)
+            # Huella con la misma expresión que la columna generada de reviews
+            cursor.execute(f"UPDATE stg_reviews SET texto_fp = {_TEXTO_FP_SQL}")
+            
+            cursor.execute("""
+                INSERT INTO reviews (
+                    restaurante, autor, rating_user, texto,
+                    fecha_aproximada, fecha_original,
+                    fecha_scraping, review_id, lugar_id
+                )
+                SELECT s.restaurante, s.autor, s.rating_user, s.texto,
+                       s.fecha_aproximada, s.fecha_original,
+                       s.fecha_scraping, s.review_id, l.id
+                FROM (
+                    -- Una fila por huella dentro del lote
+                    SELECT DISTINCT ON (restaurante, LOWER(TRIM(autor)), texto_fp) *
+                    FROM stg_reviews
+                    ORDER BY restaurante, LOWER(TRIM(autor)), texto_fp
+                ) s
+                LEFT JOIN (
+                    SELECT DISTINCT ON (nombre) nombre, id FROM lugares
+                    ORDER BY nombre, id
+                ) l ON l.nombre = s.restaurante
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM reviews r
+                    WHERE r.restaurante = s.restaurante
+                      AND LOWER(TRIM(r.autor)) = LOWER(TRIM(s.autor))
+                      AND r.texto_fp = s.texto_fp
+                )
+                ON CONFLICT DO NOTHING
+            """)
+            insertadas = cursor.rowcount
+            duplicadas = len(reviews_data) - insertadas
+            
+            conn.commit()
+            logger.info(f"✅ DB (COPY): {insertadas} insertadas, {duplicadas} duplicadas/skip")
+        
+        except Exception as e:
+            logger.error(f"❌ Error en carga masiva: {e}")
+            insertadas = 0
+            try:
+                conn.rollback()
+            except:
+                pass
+        finally:
+            cursor.close()
     
     return insertadas, duplicadas
 
 
 def verificar_review_existe(review_id):
     """Verifica si una review ya existe en la base de datos."""
-    conn = get_connection()
-    if not conn:
-        return False
+    with borrow_conn() as conn:
+        if not conn:
+            return False
     
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1 FROM reviews WHERE review_id = %s", (review_id,))
-        exists = cursor.fetchone() is not None
-        cursor.close()
-        return exists
-    except Exception as e:
-        logger.warning(f"⚠️ Error verificando review: {e}")
-        return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM reviews WHERE review_id = %s", (review_id,))
+            exists = cursor.fetchone() is not None
+            cursor.close()
+            return exists
+        except Exception as e:
+            logger.warning(f"⚠️ Error verificando review: {e}")
+            return False
 
 
 def obtener_ids_existentes_por_restaurante(restaurante_nombre):
@@ -325,353 +609,495 @@ def obtener_ids_existentes_por_restaurante(restaurante_nombre):
     Returns:
         set: Conjunto de review_ids existentes
     """
-    conn = get_connection()
-    if not conn:
-        return set()
+    with borrow_conn() as conn:
+        if not conn:
+            return set()
     
-    try:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT review_id FROM reviews WHERE restaurante = %s",
-            (restaurante_nombre,)
-        )
-        ids = {row[0] for row in cursor.fetchall()}
-        cursor.close()
-        return ids
-    except Exception as e:
-        logger.warning(f"⚠️ Error obteniendo IDs existentes: {e}")
-        return set()
+        try:
+            # Cursor con nombre (server-side): las filas llegan en tandas de itersize
+            # y van directo al set, sin materializar antes la lista completa
+            with conn.cursor(name='ids_existentes') as cursor:
+                cursor.itersize = 5000
+                cursor.execute(
+                    "SELECT review_id FROM reviews WHERE restaurante = %s",
+                    (restaurante_nombre,)
+                )
+                return {row[0] for row in cursor}
+        except Exception as e:
+            logger.warning(f"⚠️ Error obteniendo IDs existentes: {e}")
+            return set()
 
 
 def obtener_estadisticas():
-    """Obtiene estadísticas generales de la base de datos."""
-    conn = get_connection()
-    if not conn:
-        return None
+    """
+    Obtiene estadísticas generales de la base de datos.
+    Los tres contadores salen de una sola pasada sobre reviews.
+    """
+    with borrow_conn() as conn:
+        if not conn:
+            return None
     
-    try:
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM reviews")
-        total_reviews = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(DISTINCT restaurante) FROM reviews")
-        total_restaurantes = cursor.fetchone()[0]
-        
-        cursor.execute("""
-            SELECT COUNT(*) FROM reviews 
-            WHERE fecha_scraping::timestamp > NOW() - INTERVAL '24 hours'
-        """)
-        reviews_24h = cursor.fetchone()[0]
+        try:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT
+                    COUNT(*),
+                    COUNT(DISTINCT restaurante),
+                    COUNT(*) FILTER (
+                        WHERE fecha_scraping::timestamp > NOW() - INTERVAL '24 hours'
+                    )
+                FROM reviews
+            """)
+            total_reviews, total_restaurantes, reviews_24h = cursor.fetchone()
         
-        cursor.close()
+            cursor.close()
         
-        return {
-            'total_reviews': total_reviews,
-            'total_restaurantes': total_restaurantes,
-            'reviews_ultimas_24h': reviews_24h
-        }
-    except Exception as e:
-        logger.warning(f"⚠️ Error obteniendo estadísticas: {e}")
-        return None
+            return {
+                'total_reviews': total_reviews,
+                'total_restaurantes': total_restaurantes,
+                'reviews_ultimas_24h': reviews_24h
+            }
+        except Exception as e:
+            logger.warning(f"⚠️ Error obteniendo estadísticas: {e}")
+            return None
 
 
-        return False
+            return False
 
 def ensure_history_table_exists():
     """Crea la tabla de historial de reviews si no existe."""
-    conn = get_connection()
-    if not conn:
-        return False
-    try:
-        cursor = conn.cursor()
-        # Verificar si existe la tabla
-        cursor.execute("SELECT to_regclass('review_history');")
-        exists = cursor.fetchone()[0] is not None
+    with borrow_conn() as conn:
+        if not conn:
+            return False
+        try:
+            cursor = conn.cursor()
+            # Verificar si existe la tabla
+            cursor.execute("SELECT to_regclass('review_history');")
+            exists = cursor.fetchone()[0] is not None
         
-        if not exists:
+            if not exists:
+                cursor.execute("""
+                    CREATE TABLE review_history (
+                        id SERIAL PRIMARY KEY,
+                        lugar_url TEXT NOT NULL,
+                        nombre TEXT, -- Nombre del lugar al momento del registro
+                        direccion TEXT, -- Dirección para desambiguar
+                        review_count INTEGER NOT NULL,
+                        rating NUMERIC(3, 1), 
+                        delta_since_last INTEGER DEFAULT 0,
+                        recorded_at TIMESTAMP DEFAULT NOW()
+                    );
+                    CREATE INDEX idx_history_url ON review_history(lugar_url);
+                """)
+            else:
+                # Migración: agregar columnas si faltan
+                columns_to_add = [
+                    ("rating", "NUMERIC(3, 1)"),
+                    ("nombre", "TEXT"),
+                    ("direccion", "TEXT")
+                ]
+                for col_name, col_type in columns_to_add:
+                    try:
+                        cursor.execute(f"ALTER TABLE review_history ADD COLUMN IF NOT EXISTS {col_name} {col_type};")
+                    except Exception as e:
+                        logger.warning(f"Error agregando columna {col_name}: {e}")
+            
+            # Últimos registros y ventana de 7 días del diagnóstico (ORDER BY recorded_at
+            # DESC usa el mismo índice recorrido hacia atrás). Fuera del CREATE TABLE para
+            # que también se cree en tablas anteriores a este índice.
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_date ON review_history(recorded_at);")
+            
+            # Índice cubriente para obtener el último conteo por URL (index-only scan)
             cursor.execute("""
-                CREATE TABLE review_history (
-                    id SERIAL PRIMARY KEY,
-                    lugar_url TEXT NOT NULL,
-                    nombre TEXT, -- Nombre del lugar al momento del registro
-                    direccion TEXT, -- Dirección para desambiguar
-                    review_count INTEGER NOT NULL,
-                    rating NUMERIC(3, 1), 
-                    delta_since_last INTEGER DEFAULT 0,
-                    recorded_at TIMESTAMP DEFAULT NOW()
-                );
-                CREATE INDEX idx_history_url ON review_history(lugar_url);
-                CREATE INDEX idx_history_date ON review_history(recorded_at);
+                CREATE INDEX IF NOT EXISTS idx_history_url_recorded
+                ON review_history (lugar_url, recorded_at DESC) INCLUDE (review_count);
             """)
-        else:
-            # Migración: agregar columnas si faltan
-            columns_to_add = [
-                ("rating", "NUMERIC(3, 1)"),
-                ("nombre", "TEXT"),
-                ("direccion", "TEXT")
-            ]
-            for col_name, col_type in columns_to_add:
-                try:
-                    cursor.execute(f"ALTER TABLE review_history ADD COLUMN IF NOT EXISTS {col_name} {col_type};")
-                except Exception as e:
-                    logger.warning(f"Error agregando columna {col_name}: {e}")
                 
-        conn.commit()
-        return True
-    except Exception as e:
-        logger.warning(f"⚠️ Error creando tabla historial: {e}")
-        return False
-    finally:
-        cursor.close()
+            conn.commit()
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Error creando tabla historial: {e}")
+            return False
+        finally:
+            cursor.close()
 
 def log_review_history(url, current_count, current_rating=None, nombre=None, direccion=None):
     """
     Registra un snapshot de metricas (count, rating, nombre, direccion).
     Incluye lugar_id para relación formal con tabla lugares.
     """
-    conn = get_connection()
-    if not conn:
-        return False
+    with borrow_conn() as conn:
+        if not conn:
+            return False
         
-    try:
-        cursor = conn.cursor()
-        
-        # Obtener lugar_id desde la URL
-        lugar_id = None
-        cursor.execute("SELECT id FROM lugares WHERE url = %s LIMIT 1", (url,))
-        row = cursor.fetchone()
-        if row:
-            lugar_id = row[0]
-        
-        # Obtener último conteo para calcular delta
-        prev_count = 0
-        cursor.execute("""
-            SELECT review_count FROM review_history 
-            WHERE lugar_url = %s 
-            ORDER BY recorded_at DESC LIMIT 1
-        """, (url,))
-        row = cursor.fetchone()
-        if row:
-            prev_count = row[0]
-            
-        delta = current_count - prev_count
+        try:
+            cursor = conn.cursor()
         
-        # Insertar nuevo registro con lugar_id
-        cursor.execute("""
-            INSERT INTO review_history (lugar_url, review_count, rating, delta_since_last, nombre, direccion, lugar_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (url, current_count, current_rating, delta, nombre, direccion, lugar_id))
+            # Delta contra el último conteo y lugar_id calculados en el servidor (un solo round-trip)
+            cursor.execute(_SIN_ESPERA_WAL + """
+                INSERT INTO review_history (lugar_url, review_count, rating, delta_since_last, nombre, direccion, lugar_id)
+                SELECT %(url)s, %(count)s, %(rating)s,
+                       %(count)s - COALESCE((
+                           SELECT review_count FROM review_history
+                           WHERE lugar_url = %(url)s
+                           ORDER BY recorded_at DESC LIMIT 1
+                       ), 0),
+                       %(nombre)s, %(direccion)s,
+                       (SELECT id FROM lugares WHERE url = %(url)s LIMIT 1)
+                RETURNING delta_since_last
+            """, {
+                'url': url,
+                'count': current_count,
+                'rating': current_rating,
+                'nombre': nombre,
+                'direccion': direccion
+            })
+            delta = cursor.fetchone()[0]
         
-        conn.commit()
-        return delta
-    except Exception as e:
-        logger.error(f"Error logueando historial: {e}")
-        return 0
-    finally:
-        cursor.close()
+            conn.commit()
+            return delta
+        except Exception as e:
+            logger.error(f"Error logueando historial: {e}")
+            return 0
+        finally:
+            cursor.close()
+
+def ensure_monitor_claim_column():
+    """
+    Agrega lugares.monitor_reclamado_at, marca de "tomado por un worker del monitor".
+    Seguro de ejecutar múltiples veces (usa IF NOT EXISTS).
+    """
+    global _reclamo_listo
+    with borrow_conn() as conn:
+        if not conn:
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("ALTER TABLE lugares ADD COLUMN IF NOT EXISTS monitor_reclamado_at TIMESTAMP")
+            conn.commit()
+            _reclamo_listo = True
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"⚠️ Error creando columna monitor_reclamado_at: {e}")
+            return False
+        finally:
+            cursor.close()
+
 
 def get_lugares_para_monitoreo(limit=50):
     """
     Obtiene URLs de lugares para actualizar, incluyendo nombre y dirección.
+    
+    Los lugares devueltos quedan reclamados (FOR UPDATE SKIP LOCKED + monitor_reclamado_at)
+    para que varios workers en paralelo no tomen los mismos. Liberarlos al terminar con
+    liberar_lugares_monitoreo(); si el worker muere, el reclamo vence a las
+    MONITOR_RECLAMO_HORAS.
     """
-    conn = get_connection()
-    if not conn:
-        return []
+    if not _reclamo_listo:
+        ensure_monitor_claim_column()
+    
+    with borrow_conn() as conn:
+        if not conn:
+            return []
         
-    try:
-        cursor = conn.cursor()
-        # Se agrega 'direccion' al select
-        cursor.execute("""
-            SELECT url, nombre, total_reviews_google, direccion
-            FROM lugares 
-            ORDER BY fecha_scraping ASC NULLS FIRST 
-            LIMIT %s
-        """, (limit,))
+        try:
+            cursor = conn.cursor()
+            if _reclamo_listo:
+                cursor.execute("""
+                    WITH elegidos AS (
+                        SELECT id FROM lugares
+                        WHERE monitor_reclamado_at IS NULL
+                           OR monitor_reclamado_at < NOW() - make_interval(hours => %s)
+                        ORDER BY fecha_scraping ASC NULLS FIRST
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE lugares l
+                    SET monitor_reclamado_at = NOW()
+                    FROM elegidos e
+                    WHERE l.id = e.id
+                    RETURNING l.url, l.nombre, l.total_reviews_google, l.direccion, l.fecha_scraping
+                """, (MONITOR_RECLAMO_HORAS, limit))
+                filas = cursor.fetchall()
+                conn.commit()
+                # RETURNING no garantiza orden: más antiguos (y nunca scrapeados) primero
+                filas.sort(key=lambda row: (row[4] is not None, row[4] or 0))
+            else:
+                # Se agrega 'direccion' al select
+                cursor.execute("""
+                    SELECT url, nombre, total_reviews_google, direccion
+                    FROM lugares 
+                    ORDER BY fecha_scraping ASC NULLS FIRST 
+                    LIMIT %s
+                """, (limit,))
+                filas = cursor.fetchall()
         
-        lugares = []
-        for row in cursor.fetchall():
-            lugares.append({
-                'url': row[0], 
-                'nombre': row[1], 
-                'last_count': row[2],
-                'direccion': row[3]
-            })
+            lugares = []
+            for row in filas:
+                lugares.append({
+                    'url': row[0], 
+                    'nombre': row[1], 
+                    'last_count': row[2],
+                    'direccion': row[3]
+                })
             
-        return lugares
-    except Exception as e:
-        logger.warning(f"⚠️ Error obteniendo lugares para monitoreo: {e}")
-        return []
-    finally:
+            return lugares
+        except Exception as e:
+            logger.warning(f"⚠️ Error obteniendo lugares para monitoreo: {e}")
+            return []
+        finally:
+            try:
+                cursor.close()
+            except:
+                pass
+
+
+def liberar_lugares_monitoreo(urls):
+    """Quita el reclamo del monitor sobre estos lugares (procesados o no)."""
+    if not urls or not _reclamo_listo:
+        return False
+    
+    with borrow_conn() as conn:
+        if not conn:
+            return False
         try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE lugares SET monitor_reclamado_at = NULL
+                WHERE url = ANY(%s)
+            """, (list(urls),))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"⚠️ Error liberando lugares del monitor: {e}")
+            return False
+        finally:
             cursor.close()
-        except:
-            pass
 
 def ensure_log_tables_exists():
     """Crea las tablas de logs y reportes si no existen."""
-    conn = get_connection()
-    if not conn:
-        return False
-    try:
-        cursor = conn.cursor()
-        # Tabla scraping_logs
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS scraping_logs (
-                id SERIAL PRIMARY KEY,
-                fecha TIMESTAMP DEFAULT NOW(),
-                url TEXT,
-                estado TEXT, 
-                mensaje TEXT,
-                reviews_detectadas INTEGER DEFAULT 0,
-                nuevas_reviews INTEGER DEFAULT 0,
-                intentos INTEGER DEFAULT 1 -- Para retry logic
-            );
-            CREATE INDEX IF NOT EXISTS idx_logs_fecha ON scraping_logs(fecha);
-            CREATE INDEX IF NOT EXISTS idx_logs_estado ON scraping_logs(estado);
-            CREATE INDEX IF NOT EXISTS idx_logs_url ON scraping_logs(url);
-        """)
-        
-        # Migración: agregar intentos si no existe
+    with borrow_conn() as conn:
+        if not conn:
+            return False
         try:
-            cursor.execute("ALTER TABLE scraping_logs ADD COLUMN IF NOT EXISTS intentos INTEGER DEFAULT 1;")
-        except:
-            pass
+            cursor = conn.cursor()
+            # Tabla scraping_logs
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS scraping_logs (
+                    id SERIAL PRIMARY KEY,
+                    fecha TIMESTAMP DEFAULT NOW(),
+                    url TEXT,
+                    estado TEXT, 
+                    mensaje TEXT,
+                    reviews_detectadas INTEGER DEFAULT 0,
+                    nuevas_reviews INTEGER DEFAULT 0,
+                    intentos INTEGER DEFAULT 1 -- Para retry logic
+                );
+                CREATE INDEX IF NOT EXISTS idx_logs_fecha ON scraping_logs(fecha);
+                CREATE INDEX IF NOT EXISTS idx_logs_estado ON scraping_logs(estado);
+                CREATE INDEX IF NOT EXISTS idx_logs_url ON scraping_logs(url);
+            """)
+        
+            # Migración: agregar intentos si no existe
+            try:
+                cursor.execute("ALTER TABLE scraping_logs ADD COLUMN IF NOT EXISTS intentos INTEGER DEFAULT 1;")
+            except:
+                pass
             
-        # Tabla validation_reports (sin cambios)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS validation_reports (
-                id SERIAL PRIMARY KEY,
-                fecha_reporte TIMESTAMP DEFAULT NOW(),
-                total_reportadas INTEGER,
-                total_reales INTEGER,
-                discrepancias_count INTEGER,
-                detalle JSONB 
-            );
-            CREATE INDEX IF NOT EXISTS idx_valid_fecha ON validation_reports(fecha_reporte);
-        """)
+            # Tabla validation_reports (sin cambios)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS validation_reports (
+                    id SERIAL PRIMARY KEY,
+                    fecha_reporte TIMESTAMP DEFAULT NOW(),
+                    total_reportadas INTEGER,
+                    total_reales INTEGER,
+                    discrepancias_count INTEGER,
+                    detalle JSONB 
+                );
+                CREATE INDEX IF NOT EXISTS idx_valid_fecha ON validation_reports(fecha_reporte);
+            """)
         
-        conn.commit()
-        return True
-    except Exception as e:
-        logger.warning(f"⚠️ Error creando tablas de logs: {e}")
-        return False
-    finally:
-        try:
-            cursor.close()
-        except:
-            pass
+            conn.commit()
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Error creando tablas de logs: {e}")
+            return False
+        finally:
+            try:
+                cursor.close()
+            except:
+                pass
 
 def log_scraping_event(url, estado, mensaje, reviews_detectadas=0, nuevas_reviews=0, intentos=1):
     """
-    Guarda un evento de scraping en la base de datos.
+    Registra un evento de scraping. Se acumula en memoria y se guarda en lote
+    (ver flush_logs); la fecha del evento se conserva aunque se escriba después.
     Incluye lugar_id para relación formal con tabla lugares.
     """
-    conn = get_connection()
-    if not conn:
+    if _get_pool() is None:
         return False
-    try:
-        cursor = conn.cursor()
-        
-        # Obtener lugar_id desde la URL
-        lugar_id = None
-        cursor.execute("SELECT id FROM lugares WHERE url = %s LIMIT 1", (url,))
-        row = cursor.fetchone()
-        if row:
-            lugar_id = row[0]
-        
-        cursor.execute("""
-            INSERT INTO scraping_logs (url, estado, mensaje, reviews_detectadas, nuevas_reviews, intentos, lugar_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (url, estado, mensaje, reviews_detectadas, nuevas_reviews, intentos, lugar_id))
-        conn.commit()
+    
+    with _log_lock:
+        _log_buffer.append((time.monotonic(), url, estado, mensaje, reviews_detectadas, nuevas_reviews, intentos))
+        hay_que_volcar = (
+            len(_log_buffer) >= LOG_BUFFER_MAX
+            or time.monotonic() - _log_ultimo_flush >= LOG_FLUSH_SEG
+        )
+    
+    if hay_que_volcar:
+        flush_logs()
+    return True
+
+
+def _reencolar_logs(pendientes):
+    """
+    Devuelve al buffer (adelante, por ser más antiguos) los eventos que no se
+    pudieron guardar. Si no entran todos se descartan los más viejos, avisando:
+    extendleft sobre el deque lleno tiraría los eventos más nuevos en silencio.
+    """
+    with _log_lock:
+        libres = _log_buffer.maxlen - len(_log_buffer)
+        descartados = max(len(pendientes) - libres, 0)
+        if descartados:
+            pendientes = pendientes[descartados:]
+        _log_buffer.extendleft(reversed(pendientes))
+    if descartados:
+        logger.warning(f"⚠️ Buffer de logs lleno: se descartan {descartados} eventos sin guardar")
+
+
+def flush_logs():
+    """Guarda en scraping_logs todos los eventos pendientes con un execute_batch."""
+    global _log_ultimo_flush
+    with _log_lock:
+        pendientes = list(_log_buffer)
+        _log_buffer.clear()
+        _log_ultimo_flush = time.monotonic()
+    
+    if not pendientes:
         return True
-    except Exception as e:
-        logger.error(f"Error logueando evento: {e}")
-        return False
-    finally:
-        cursor.close()
+    
+    with borrow_conn() as conn:
+        if not conn:
+            # Sin conexión: conservar los eventos para el próximo volcado
+            _reencolar_logs(pendientes)
+            return False
+        cursor = None
+        try:
+            from psycopg2.extras import execute_batch
+            cursor = conn.cursor()
+            
+            # fecha = NOW() menos la antigüedad del evento en el buffer
+            cursor.execute(_SIN_ESPERA_WAL)
+            ahora = time.monotonic()
+            filas = [
+                (url, estado, mensaje, reviews_detectadas, nuevas_reviews, intentos, url, ahora - t_evento)
+                for t_evento, url, estado, mensaje, reviews_detectadas, nuevas_reviews, intentos in pendientes
+            ]
+            execute_batch(cursor, """
+                INSERT INTO scraping_logs (url, estado, mensaje, reviews_detectadas, nuevas_reviews, intentos, lugar_id, fecha)
+                VALUES (%s, %s, %s, %s, %s, %s,
+                        (SELECT id FROM lugares WHERE url = %s LIMIT 1),
+                        NOW() - make_interval(secs => %s))
+            """, filas, page_size=LOG_BUFFER_MAX)
+            conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error logueando eventos ({len(pendientes)}): {e}")
+            # Devolver al buffer para reintentar en el próximo volcado
+            _reencolar_logs(pendientes)
+            return False
+        finally:
+            if cursor is not None:
+                cursor.close()
+
+
+# No perder eventos pendientes al terminar el proceso
+atexit.register(flush_logs)
 
 def get_latest_scraping_states():
     """
     Retorna un diccionario con el último estado y nro de intentos para cada URL.
     {url: {'estado': 'EXITO', 'intentos': 1, 'fecha': ...}}
     """
-    conn = get_connection()
-    if not conn:
-        return {}
-    try:
-        cursor = conn.cursor()
-        # DISTINCT ON (url) nos da la última entrada para cada URL si ordenamos por fecha DESC
-        cursor.execute("""
-            SELECT DISTINCT ON (url) url, estado, intentos, fecha 
-            FROM scraping_logs 
-            ORDER BY url, fecha DESC
-        """)
+    flush_logs()
+    with borrow_conn() as conn:
+        if not conn:
+            return {}
+        try:
+            cursor = conn.cursor()
+            # DISTINCT ON (url) nos da la última entrada para cada URL si ordenamos por fecha DESC
+            cursor.execute("""
+                SELECT DISTINCT ON (url) url, estado, intentos, fecha 
+                FROM scraping_logs 
+                ORDER BY url, fecha DESC
+            """)
         
-        estados = {}
-        for row in cursor.fetchall():
-            estados[row[0]] = {
-                'estado': row[1],
-                'intentos': row[2],
-                'fecha': row[3]
-            }
-        return estados
-    except Exception as e:
-        logger.error(f"Error obteniendo estados de scraping: {e}")
-        return {}
-    finally:
-        cursor.close()
+            estados = {}
+            for row in cursor.fetchall():
+                estados[row[0]] = {
+                    'estado': row[1],
+                    'intentos': row[2],
+                    'fecha': row[3]
+                }
+            return estados
+        except Exception as e:
+            logger.error(f"Error obteniendo estados de scraping: {e}")
+            return {}
+        finally:
+            cursor.close()
 
 def log_validation_report(total_reportadas, total_reales, discrepancias_count, detalle_json):
     """Guarda un reporte de validación en la base de datos."""
-    conn = get_connection()
-    if not conn:
-        return False
-    try:
-        import json
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO validation_reports (total_reportadas, total_reales, discrepancias_count, detalle)
-            VALUES (%s, %s, %s, %s)
-        """, (total_reportadas, total_reales, discrepancias_count, json.dumps(detalle_json)))
-        conn.commit()
-        return True
-    except Exception as e:
-        logger.error(f"Error logueando reporte validacion: {e}")
-        return False
-    finally:
-        cursor.close()
+    with borrow_conn() as conn:
+        if not conn:
+            return False
+        try:
+            import json
+            cursor = conn.cursor()
+            cursor.execute(_SIN_ESPERA_WAL + """
+                INSERT INTO validation_reports (total_reportadas, total_reales, discrepancias_count, detalle)
+                VALUES (%s, %s, %s, %s)
+            """, (total_reportadas, total_reales, discrepancias_count, json.dumps(detalle_json)))
+            conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error logueando reporte validacion: {e}")
+            return False
+        finally:
+            cursor.close()
 
 def get_ultima_review_restaurante(restaurante_nombre):
     """
     Obtiene la reseña más reciente de un restaurante para early-stop optimization.
     Retorna: dict con 'autor' y 'texto_inicio' (primeros 100 chars) o None si no hay.
     """
-    conn = get_connection()
-    if not conn:
-        return None
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT autor, LEFT(texto, 100) as texto_inicio
-            FROM reviews 
-            WHERE restaurante = %s 
-            ORDER BY fecha_scraping DESC 
-            LIMIT 1
-        """, (restaurante_nombre,))
-        row = cursor.fetchone()
-        if row:
-            return {
-                'autor': (row[0] or '').strip().lower(),
-                'texto_inicio': ' '.join((row[1] or '').lower().split())
-            }
-        return None
-    except Exception as e:
-        logger.warning(f"Error obteniendo última review: {e}")
-        return None
-    finally:
-        cursor.close()
+    with borrow_conn() as conn:
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT autor, LEFT(texto, 100) as texto_inicio
+                FROM reviews 
+                WHERE restaurante = %s 
+                ORDER BY fecha_scraping DESC 
+                LIMIT 1
+            """, (restaurante_nombre,))
+            row = cursor.fetchone()
+            if row:
+                return {
+                    'autor': (row[0] or '').strip().lower(),
+                    'texto_inicio': ' '.join((row[1] or '').lower().split())
+                }
+            return None
+        except Exception as e:
+            logger.warning(f"Error obteniendo última review: {e}")
+            return None
+        finally:
+            cursor.close()
 
 
 def get_ultimas_N_reviews_restaurante(restaurante_nombre, n=2):
@@ -679,31 +1105,31 @@ def get_ultimas_N_reviews_restaurante(restaurante_nombre, n=2):
     Obtiene las N reseñas más recientes para early-stop robusto.
     Retorna: lista de dicts con 'autor' y 'texto_inicio' (primeros 100 chars)
     """
-    conn = get_connection()
-    if not conn:
-        return []
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT autor, LEFT(texto, 100) as texto_inicio
-            FROM reviews 
-            WHERE restaurante = %s 
-            ORDER BY fecha_scraping DESC 
-            LIMIT %s
-        """, (restaurante_nombre, n))
-        rows = cursor.fetchall()
-        return [
-            {
-                'autor': (row[0] or '').strip().lower(),
-                'texto_inicio': ' '.join((row[1] or '').lower().split())
-            }
-            for row in rows
-        ]
-    except Exception as e:
-        logger.warning(f"Error obteniendo últimas {n} reviews: {e}")
-        return []
-    finally:
-        cursor.close()
+    with borrow_conn() as conn:
+        if not conn:
+            return []
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT autor, LEFT(texto, 100) as texto_inicio
+                FROM reviews 
+                WHERE restaurante = %s 
+                ORDER BY fecha_scraping DESC 
+                LIMIT %s
+            """, (restaurante_nombre, n))
+            rows = cursor.fetchall()
+            return [
+                {
+                    'autor': (row[0] or '').strip().lower(),
+                    'texto_inicio': ' '.join((row[1] or '').lower().split())
+                }
+                for row in rows
+            ]
+        except Exception as e:
+            logger.warning(f"Error obteniendo últimas {n} reviews: {e}")
+            return []
+        finally:
+            cursor.close()
 
 
 def migrate_embedding_columns():
@@ -711,34 +1137,34 @@ def migrate_embedding_columns():
     Agrega columnas necesarias para el sistema de embeddings inteligentes.
     Seguro de ejecutar múltiples veces (usa IF NOT EXISTS).
     """
-    conn = get_connection()
-    if not conn:
-        return False
+    with borrow_conn() as conn:
+        if not conn:
+            return False
     
-    try:
-        cursor = conn.cursor()
+        try:
+            cursor = conn.cursor()
         
-        # Agregar columna resumen_reviews si no existe
-        cursor.execute("""
-            ALTER TABLE lugares 
-            ADD COLUMN IF NOT EXISTS resumen_reviews TEXT
-        """)
+            # Agregar columna resumen_reviews si no existe
+            cursor.execute("""
+                ALTER TABLE lugares 
+                ADD COLUMN IF NOT EXISTS resumen_reviews TEXT
+            """)
         
-        # Agregar columna embedding_updated_at si no existe
-        cursor.execute("""
-            ALTER TABLE lugares 
-            ADD COLUMN IF NOT EXISTS embedding_updated_at TIMESTAMP
-        """)
+            # Agregar columna embedding_updated_at si no existe
+            cursor.execute("""
+                ALTER TABLE lugares 
+                ADD COLUMN IF NOT EXISTS embedding_updated_at TIMESTAMP
+            """)
         
-        conn.commit()
-        logger.info("✅ Migración de columnas de embedding completada")
-        return True
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"❌ Error en migración: {e}")
-        return False
-    finally:
-        cursor.close()
+            conn.commit()
+            logger.info("✅ Migración de columnas de embedding completada")
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"❌ Error en migración: {e}")
+            return False
+        finally:
+            cursor.close()
 
 
 def get_lugares_para_embedding():
@@ -746,70 +1172,70 @@ def get_lugares_para_embedding():
     Obtiene todos los lugares con sus reviews para generar embeddings.
     Retorna: lista de dicts con nombre, resumen_reviews, embedding_updated_at
     """
-    conn = get_connection()
-    if not conn:
-        return []
+    with borrow_conn() as conn:
+        if not conn:
+            return []
     
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT nombre, resumen_reviews, embedding_updated_at, 
-                   rating_gral, direccion, zona, barrio, categoria
-            FROM lugares
-            ORDER BY nombre
-        """)
-        rows = cursor.fetchall()
-        return [
-            {
-                'nombre': row[0],
-                'resumen_reviews': row[1],
-                'embedding_updated_at': row[2],
-                'rating_gral': row[3],
-                'direccion': row[4],
-                'zona': row[5],
-                'barrio': row[6],
-                'categoria': row[7]
-            }
-            for row in rows
-        ]
-    except Exception as e:
-        logger.error(f"Error obteniendo lugares para embedding: {e}")
-        return []
-    finally:
-        cursor.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT nombre, resumen_reviews, embedding_updated_at, 
+                       rating_gral, direccion, zona, barrio, categoria
+                FROM lugares
+                ORDER BY nombre
+            """)
+            rows = cursor.fetchall()
+            return [
+                {
+                    'nombre': row[0],
+                    'resumen_reviews': row[1],
+                    'embedding_updated_at': row[2],
+                    'rating_gral': row[3],
+                    'direccion': row[4],
+                    'zona': row[5],
+                    'barrio': row[6],
+                    'categoria': row[7]
+                }
+                for row in rows
+            ]
+        except Exception as e:
+            logger.error(f"Error obteniendo lugares para embedding: {e}")
+            return []
+        finally:
+            cursor.close()
 
 
 def get_reviews_nuevas_sin_embedding(lugar_nombre, desde_fecha):
     """
     Obtiene reseñas de un lugar que son más nuevas que la fecha dada.
     """
-    conn = get_connection()
-    if not conn:
-        return []
+    with borrow_conn() as conn:
+        if not conn:
+            return []
     
-    try:
-        cursor = conn.cursor()
-        if desde_fecha:
-            cursor.execute("""
-                SELECT texto FROM reviews 
-                WHERE restaurante = %s AND fecha_scraping::timestamp > %s
-                ORDER BY fecha_scraping DESC
-            """, (lugar_nombre, desde_fecha))
-        else:
-            # Si no hay fecha, obtener todas
-            cursor.execute("""
-                SELECT texto FROM reviews 
-                WHERE restaurante = %s
-                ORDER BY fecha_scraping DESC
-            """, (lugar_nombre,))
+        try:
+            cursor = conn.cursor()
+            if desde_fecha:
+                cursor.execute("""
+                    SELECT texto FROM reviews 
+                    WHERE restaurante = %s AND fecha_scraping::timestamp > %s
+                    ORDER BY fecha_scraping DESC
+                """, (lugar_nombre, desde_fecha))
+            else:
+                # Si no hay fecha, obtener todas
+                cursor.execute("""
+                    SELECT texto FROM reviews 
+                    WHERE restaurante = %s
+                    ORDER BY fecha_scraping DESC
+                """, (lugar_nombre,))
         
-        rows = cursor.fetchall()
-        return [row[0] for row in rows if row[0]]
-    except Exception as e:
-        logger.error(f"Error obteniendo reviews nuevas: {e}")
-        return []
-    finally:
-        cursor.close()
+            rows = cursor.fetchall()
+            return [row[0] for row in rows if row[0]]
+        except Exception as e:
+            logger.error(f"Error obteniendo reviews nuevas: {e}")
+            return []
+        finally:
+            cursor.close()
 
 
 def get_todas_reviews_lugar(lugar_nombre):
@@ -817,51 +1243,309 @@ def get_todas_reviews_lugar(lugar_nombre):
     Obtiene todas las reseñas de un lugar con texto y rating.
     Retorna lista de dicts con 'texto' y 'rating'.
     """
-    conn = get_connection()
-    if not conn:
-        return []
+    with borrow_conn() as conn:
+        if not conn:
+            return []
     
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT texto, rating_user, fecha_scraping FROM reviews 
-            WHERE restaurante = %s
-            ORDER BY fecha_scraping DESC
-        """, (lugar_nombre,))
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT texto, rating_user, fecha_scraping FROM reviews 
+                WHERE restaurante = %s
+                ORDER BY fecha_scraping DESC
+            """, (lugar_nombre,))
         
-        rows = cursor.fetchall()
-        return [
-            {'texto': row[0], 'rating': row[1], 'fecha': row[2]}
-            for row in rows if row[0]
-        ]
-    except Exception as e:
-        logger.error(f"Error obteniendo todas las reviews: {e}")
-        return []
-    finally:
-        cursor.close()
+            rows = cursor.fetchall()
+            return [
+                {'texto': row[0], 'rating': row[1], 'fecha': row[2]}
+                for row in rows if row[0]
+            ]
+        except Exception as e:
+            logger.error(f"Error obteniendo todas las reviews: {e}")
+            return []
+        finally:
+            cursor.close()
 
 
 def actualizar_resumen_lugar(nombre, resumen):
     """
     Actualiza el resumen y la fecha de embedding de un lugar.
     """
-    conn = get_connection()
-    if not conn:
+    with borrow_conn() as conn:
+        if not conn:
+            return False
+    
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE lugares 
+                SET resumen_reviews = %s, 
+                    embedding_updated_at = NOW()
+                WHERE nombre = %s
+            """, (resumen, nombre))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error actualizando resumen: {e}")
+            return False
+        finally:
+            cursor.close()
+
+
+def ensure_summary_cache_table():
+    """
+    Crea la tabla summary_cache (resúmenes de DeepSeek indexados por hash del prompt).
+    Seguro de ejecutar múltiples veces (usa IF NOT EXISTS).
+    """
+    global _summary_cache_listo
+    with borrow_conn() as conn:
+        if not conn:
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS summary_cache (
+                    prompt_hash BYTEA PRIMARY KEY,
+                    resumen TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+            conn.commit()
+            _summary_cache_listo = True
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"⚠️ Error creando tabla summary_cache: {e}")
+            return False
+        finally:
+            cursor.close()
+
+
+def get_resumen_cacheado(prompt_hash):
+    """Devuelve el resumen guardado para ese hash de prompt, o None."""
+    if not _summary_cache_listo and not ensure_summary_cache_table():
+        return None
+    
+    with borrow_conn() as conn:
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT resumen FROM summary_cache WHERE prompt_hash = %s", (prompt_hash,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.warning(f"⚠️ Error leyendo summary_cache: {e}")
+            return None
+        finally:
+            cursor.close()
+
+
+def guardar_resumen_cacheado(prompt_hash, resumen):
+    """Guarda un resumen en summary_cache (si ya existía, no hace nada)."""
+    if not _summary_cache_listo and not ensure_summary_cache_table():
         return False
     
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE lugares 
-            SET resumen_reviews = %s, 
-                embedding_updated_at = NOW()
-            WHERE nombre = %s
-        """, (resumen, nombre))
-        conn.commit()
-        return True
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Error actualizando resumen: {e}")
+    with borrow_conn() as conn:
+        if not conn:
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO summary_cache (prompt_hash, resumen)
+                VALUES (%s, %s)
+                ON CONFLICT (prompt_hash) DO NOTHING
+            """, (prompt_hash, resumen))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"⚠️ Error guardando en summary_cache: {e}")
+            return False
+        finally:
+            cursor.close()
+
+
+def get_clasificaciones_cacheadas(categorias):
+    """
+    Devuelve las clasificaciones ya conocidas para estas categorías de Google Maps.
+    Returns: dict {categoria: {"es_valido": bool, "razon": str}}
+    """
+    if not categorias:
+        return {}
+    if not _clasificacion_cache_lista and not ensure_clasificacion_cache_table():
+        return {}
+    
+    with borrow_conn() as conn:
+        if not conn:
+            return {}
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT categoria, es_gastronomico, razon
+                FROM clasificacion_cache
+                WHERE categoria = ANY(%s)
+            """, (list(categorias),))
+            return {
+                categoria: {"es_valido": es_gastronomico, "razon": razon}
+                for categoria, es_gastronomico, razon in cursor.fetchall()
+            }
+        except Exception as e:
+            logger.warning(f"⚠️ Error leyendo clasificacion_cache: {e}")
+            return {}
+        finally:
+            cursor.close()
+
+
+def guardar_clasificaciones(resultados):
+    """Guarda (o actualiza) clasificaciones {categoria: {"es_valido", "razon"}}."""
+    if not resultados:
         return False
-    finally:
-        cursor.close()
+    if not _clasificacion_cache_lista and not ensure_clasificacion_cache_table():
+        return False
+    
+    with borrow_conn() as conn:
+        if not conn:
+            return False
+        try:
+            from psycopg2.extras import execute_values
+            cursor = conn.cursor()
+            execute_values(cursor, """
+                INSERT INTO clasificacion_cache (categoria, es_gastronomico, razon)
+                VALUES %s
+                ON CONFLICT (categoria) DO UPDATE SET
+                    es_gastronomico = EXCLUDED.es_gastronomico,
+                    razon = EXCLUDED.razon,
+                    updated_at = NOW()
+            """, [(cat, r["es_valido"], r.get("razon")) for cat, r in resultados.items()])
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"⚠️ Error guardando en clasificacion_cache: {e}")
+            return False
+        finally:
+            cursor.close()
+
+
+def ensure_clasificacion_cache_table():
+    """
+    Crea la tabla clasificacion_cache (categoría de Google Maps → es gastronómica).
+    Seguro de ejecutar múltiples veces (usa IF NOT EXISTS).
+    """
+    global _clasificacion_cache_lista
+    with borrow_conn() as conn:
+        if not conn:
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS clasificacion_cache (
+                    categoria TEXT PRIMARY KEY,
+                    es_gastronomico BOOLEAN NOT NULL,
+                    razon TEXT,
+                    updated_at TIMESTAMPTZ DEFAULT NOW()
+                )
+            """)
+            conn.commit()
+            _clasificacion_cache_lista = True
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"⚠️ Error creando tabla clasificacion_cache: {e}")
+            return False
+        finally:
+            cursor.close()
+
+
+def get_categorias_lugares_cacheadas(links, ttl_dias=CATEGORIA_LUGAR_TTL_DIAS):
+    """
+    Devuelve las categorías de los links pedidos extraídas de Google Maps en los
+    últimos ttl_dias días.
+    Returns: dict {link: (categoria, esta_cerrado)}
+    """
+    if not links:
+        return {}
+    if not _categoria_lugar_cache_lista and not ensure_categoria_lugar_cache_table():
+        return {}
+    
+    with borrow_conn() as conn:
+        if not conn:
+            return {}
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT link, categoria, cerrado
+                FROM categoria_lugar_cache
+                WHERE link = ANY(%s)
+                  AND fetched_at > NOW() - make_interval(days => %s)
+            """, (list(links), ttl_dias))
+            return {link: (categoria, cerrado) for link, categoria, cerrado in cursor.fetchall()}
+        except Exception as e:
+            logger.warning(f"⚠️ Error leyendo categoria_lugar_cache: {e}")
+            return {}
+        finally:
+            cursor.close()
+
+
+def guardar_categorias_lugares(categorias):
+    """Guarda (o actualiza) categorías extraídas {link: (categoria, esta_cerrado)}."""
+    if not categorias:
+        return False
+    if not _categoria_lugar_cache_lista and not ensure_categoria_lugar_cache_table():
+        return False
+    
+    with borrow_conn() as conn:
+        if not conn:
+            return False
+        try:
+            from psycopg2.extras import execute_values
+            cursor = conn.cursor()
+            execute_values(cursor, """
+                INSERT INTO categoria_lugar_cache (link, categoria, cerrado)
+                VALUES %s
+                ON CONFLICT (link) DO UPDATE SET
+                    categoria = EXCLUDED.categoria,
+                    cerrado = EXCLUDED.cerrado,
+                    fetched_at = NOW()
+            """, [(link, categoria, cerrado) for link, (categoria, cerrado) in categorias.items()],
+                page_size=1000)
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"⚠️ Error guardando en categoria_lugar_cache: {e}")
+            return False
+        finally:
+            cursor.close()
+
+
+def ensure_categoria_lugar_cache_table():
+    """
+    Crea la tabla categoria_lugar_cache (link del lugar → categoría de Google Maps).
+    Seguro de ejecutar múltiples veces (usa IF NOT EXISTS).
+    """
+    global _categoria_lugar_cache_lista
+    with borrow_conn() as conn:
+        if not conn:
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS categoria_lugar_cache (
+                    link TEXT PRIMARY KEY,
+                    categoria TEXT,
+                    cerrado BOOLEAN NOT NULL DEFAULT FALSE,
+                    fetched_at TIMESTAMPTZ DEFAULT NOW()
+                )
+            """)
+            conn.commit()
+            _categoria_lugar_cache_lista = True
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"⚠️ Error creando tabla categoria_lugar_cache: {e}")
+            return False
+        finally:
+            cursor.close()
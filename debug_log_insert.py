@@ -1,5 +1,5 @@
 
-from db_utils import log_scraping_event, get_connection
+from db_utils import log_scraping_event, flush_logs, get_connection
 
 print("Prueba de inserción en scraping_logs...")
 try:
@@ -13,7 +13,7 @@ try:
         reviews_detectadas=0,
         nuevas_reviews=0,
         intentos=1
-    )
+    ) and flush_logs()  # El evento queda en buffer hasta el volcado
     
     if success:
         print("✅ ÉXITO: Log insertado correctamente.")
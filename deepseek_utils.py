@@ -4,15 +4,41 @@ Usado para generar resúmenes de reseñas y detectar información nueva.
 """
 import os
 import re
+import hashlib
+import heapq
 import random
 import requests
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from db_utils import get_resumen_cacheado, guardar_resumen_cacheado
 
 logger = logging.getLogger(__name__)
 
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
 
+# Llamadas simultáneas a la API (respetar rate limits de DeepSeek)
+DEEPSEEK_CONCURRENCY = int(os.getenv("DEEPSEEK_CONCURRENCY", 4))
+
+# Sesión HTTP compartida por el proceso (keep-alive + reintentos)
+_HTTP_SESSION = None
+_HTTP_SESSION_LOCK = threading.Lock()
+
+
+# Una sola pasada de limpieza. El orden de las alternativas importa:
+# 1) espacios en blanco consecutivos → " "
+# 2) puntuación repetida ("...", "!!", "??", "--") → un solo carácter
+# 3) cualquier carácter repetido 3+ veces (ej: "holaaaa") → uno solo
+_RE_LIMPIEZA = re.compile(r'\s+|([.!?-])\1+|(.)\2{2,}')
+
+
+def _reemplazo_limpieza(match):
+    return match.group(1) or match.group(2) or ' '
+
 
 def limpiar_texto(texto):
     """
@@ -24,20 +50,32 @@ def limpiar_texto(texto):
     if not texto:
         return ""
     
-    # Reducir puntuación repetida
-    texto = re.sub(r'\.{2,}', '.', texto)  # ... → .
-    texto = re.sub(r'!{2,}', '!', texto)   # !!! → !
-    texto = re.sub(r'\?{2,}', '?', texto)  # ??? → ?
-    texto = re.sub(r'-{2,}', '-', texto)   # --- → -
-    
-    # Reducir repetición excesiva de letras (ej: "holaaaa" -> "hola")
-    # Detecta cualquier carácter repetido 3 o más veces y lo deja en 1
-    texto = re.sub(r'(.)\1{2,}', r'\1', texto)
-    
-    # Reducir espacios
-    texto = re.sub(r'\s+', ' ', texto)
+    return _RE_LIMPIEZA.sub(_reemplazo_limpieza, texto).strip()
+
+
+def _get_http_session():
+    """Devuelve la sesión HTTP hacia DeepSeek, con headers fijos y reintentos."""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is not None:
+        return _HTTP_SESSION
     
-    return texto.strip()
+    with _HTTP_SESSION_LOCK:
+        if _HTTP_SESSION is None:
+            # POST no se reintenta por defecto en urllib3: habilitarlo explícitamente
+            retry = Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["POST"])
+            )
+            session = requests.Session()
+            session.headers.update({
+                "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
+                "Content-Type": "application/json"
+            })
+            session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+            _HTTP_SESSION = session
+    return _HTTP_SESSION
 
 
 def _call_deepseek(messages, max_tokens=500, temperature=0.3):
@@ -45,11 +83,6 @@ def _call_deepseek(messages, max_tokens=500, temperature=0.3):
     if not DEEPSEEK_API_KEY:
         raise ValueError("DEEPSEEK_API_KEY no configurada")
     
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
     payload = {
         "model": "deepseek-chat",
         "messages": messages,
@@ -57,13 +90,13 @@ def _call_deepseek(messages, max_tokens=500, temperature=0.3):
         "temperature": temperature
     }
     
-    response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload, timeout=60)
+    response = _get_http_session().post(DEEPSEEK_API_URL, json=payload, timeout=60)
     response.raise_for_status()
     
     return response.json()["choices"][0]["message"]["content"].strip()
 
 
-def muestreo_estrategico(reviews, total=50):
+def muestreo_estrategico(reviews, total=50, rng=random):
     """
     Selecciona reseñas estratégicamente para maximizar diversidad.
     
@@ -76,6 +109,7 @@ def muestreo_estrategico(reviews, total=50):
     Args:
         reviews: lista de dicts con 'texto', 'rating', 'fecha'
         total: cantidad total a seleccionar
+        rng: generador aleatorio (por defecto el módulo random)
         
     Returns:
         lista de dicts (reviews completas) seleccionadas
@@ -83,38 +117,76 @@ def muestreo_estrategico(reviews, total=50):
     if len(reviews) <= total:
         return [r for r in reviews if r.get('texto')]
     
-    seleccionadas = set()
-    items_seleccionados = []
+    # Bitmap de seleccionadas indexado por posición (un byte por reseña): más barato
+    # que un set y el resultado respeta el orden original (fecha DESC).
+    n = len(reviews)
+    elegida = bytearray(n)
+    cantidad = 0
     
-    def agregar(review):
-        if id(review) not in seleccionadas and review.get('texto'):
-            seleccionadas.add(id(review))
-            items_seleccionados.append(review)
+    def agregar(indices):
+        nonlocal cantidad
+        for i in indices:
+            if not elegida[i] and reviews[i].get('texto'):
+                elegida[i] = 1
+                cantidad += 1
+    
+    def largo(i):
+        return len(str(reviews[i].get('texto', '')))
     
     # 1. 20 más recientes (ya vienen ordenadas por fecha DESC)
-    for r in reviews[:20]:
-        agregar(r)
+    agregar(range(min(20, n)))
     
-    # 2. 10 más largas
-    por_largo = sorted(reviews, key=lambda x: len(str(x.get('texto', ''))), reverse=True)
-    for r in por_largo[:10]:
-        agregar(r)
+    # 2. 10 más largas (heap de tamaño 10 en vez de ordenar toda la lista)
+    agregar(heapq.nlargest(10, range(n), key=largo))
     
     # 3. 10 con ratings extremos
-    extremos = [r for r in reviews if r.get('rating') in [1, 2, 5]]
-    random.shuffle(extremos)
-    for r in extremos[:10]:
-        agregar(r)
+    idx_extremos = [i for i, r in enumerate(reviews) if r.get('rating') in (1, 2, 5)]
+    agregar(rng.sample(idx_extremos, min(10, len(idx_extremos))))
     
     # 4. Rellenar con aleatorias hasta llegar al total
-    restantes = [r for r in reviews if id(r) not in seleccionadas]
-    random.shuffle(restantes)
-    for r in restantes:
-        if len(items_seleccionados) >= total:
-            break
-        agregar(r)
+    faltan = total - cantidad
+    if faltan > 0:
+        restantes = [i for i in range(n) if not elegida[i] and reviews[i].get('texto')]
+        agregar(rng.sample(restantes, min(faltan, len(restantes))))
     
-    return items_seleccionados
+    return [r for r, sel in zip(reviews, elegida) if sel]
+
+
+# Reseñas casi idénticas ("excelente atención, volvería!") no aportan al resumen:
+# se descartan si su similitud de Jaccard sobre 5-gramas supera este umbral.
+UMBRAL_SIMILITUD = 0.85
+
+
+def _shingles(texto, k=5):
+    """Conjunto de k-gramas de caracteres del texto (en minúsculas)."""
+    texto = texto.lower()
+    if len(texto) <= k:
+        return {texto}
+    return {texto[i:i + k] for i in range(len(texto) - k + 1)}
+
+
+def descartar_casi_duplicadas(textos, umbral=UMBRAL_SIMILITUD):
+    """
+    Devuelve los índices de los textos a conservar, descartando los que son
+    casi duplicados de uno anterior (se conserva la primera aparición).
+    Comparación exhaustiva: con ~50 reseñas son ~1200 intersecciones de sets.
+    """
+    conservados = []
+    shingles_conservados = []
+    for i, texto in enumerate(textos):
+        sh = _shingles(texto)
+        duplicada = False
+        for otro in shingles_conservados:
+            # Cota rápida: si los tamaños difieren mucho, la similitud no llega al umbral
+            if min(len(sh), len(otro)) < umbral * max(len(sh), len(otro)):
+                continue
+            if len(sh & otro) / len(sh | otro) >= umbral:
+                duplicada = True
+                break
+        if not duplicada:
+            conservados.append(i)
+            shingles_conservados.append(sh)
+    return conservados
 
 
 def generar_resumen_reviews(reviews_data, nombre_lugar=""):
@@ -135,18 +207,24 @@ def generar_resumen_reviews(reviews_data, nombre_lugar=""):
         if len(valid_items) < 5:
             return "No se cuenta con suficiente información sobre este lugar para generar un resumen detallado."
         
-        # 2. Muestreo estratégico solo sobre las válidas
-        items = muestreo_estrategico(valid_items, total=50)
+        # 2. Muestreo estratégico solo sobre las válidas.
+        # Semilla fija por lugar: mismas reseñas → misma muestra → mismo prompt (cacheable)
+        items = muestreo_estrategico(valid_items, total=50, rng=random.Random(nombre_lugar))
     
     if not items:
         return ""
     
-    # Limpiar y concatenar reseñas con rating (1000 chars cada una)
+    # Limpiar reseñas (1000 chars cada una) y descartar las casi duplicadas
+    textos = [limpiar_texto(str(item.get('texto', '')))[:1000] for item in items]
+    conservados = descartar_casi_duplicadas(textos)
+    if len(conservados) < len(items):
+        logger.debug(f"Descartadas {len(items) - len(conservados)} reseñas casi duplicadas")
+    
+    # Concatenar reseñas con rating
     formatted_reviews = []
-    for item in items:
-        txt = limpiar_texto(str(item.get('texto', '')))[:1000]
-        pts = item.get('rating', '?')
-        formatted_reviews.append(f"[{pts}★] {txt}")
+    for i in conservados:
+        pts = items[i].get('rating', '?')
+        formatted_reviews.append(f"[{pts}★] {textos[i]}")
         
     reseñas_concat = "\n---\n".join(formatted_reviews)
     
@@ -171,13 +249,24 @@ RESEÑAS PARA ANALIZAR:
 
 Genera SOLO el texto descriptivo final, sin introducción ni comentarios."""
 
+    # Si el prompt es idéntico a uno ya resumido, reutilizar ese resumen
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).digest()
+    cacheado = get_resumen_cacheado(prompt_hash)
+    if cacheado:
+        logger.info("   ♻️ Resumen reutilizado de summary_cache")
+        return cacheado
+    
     messages = [{"role": "user", "content": prompt}]
     
     try:
-        return _call_deepseek(messages, max_tokens=500, temperature=0.3)
+        resumen = _call_deepseek(messages, max_tokens=500, temperature=0.3)
     except Exception as e:
         logger.error(f"Error generando resumen: {e}")
         return ""
+    
+    if resumen:
+        guardar_resumen_cacheado(prompt_hash, resumen)
+    return resumen
 
 
 def detectar_info_nueva(resumen_actual, reseñas_nuevas_textos):
@@ -221,3 +310,25 @@ Responde SOLO con "SI" o "NO"."""
     except Exception as e:
         logger.error(f"Error detectando info nueva: {e}")
         return True  # En caso de error, regenerar por seguridad
+
+
+def generar_resumenes_batch(lugares_reviews):
+    """
+    Genera resúmenes para varios lugares en paralelo. La llamada a DeepSeek es
+    I/O-bound, así que los hilos solapan la espera de la API.
+    
+    Args:
+        lugares_reviews: lista de tuplas (nombre_lugar, reviews_data)
+    
+    Returns:
+        lista de resúmenes en el mismo orden ("" si falló alguno)
+    """
+    if not lugares_reviews:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=DEEPSEEK_CONCURRENCY) as executor:
+        futuros = [
+            executor.submit(generar_resumen_reviews, reviews, nombre)
+            for nombre, reviews in lugares_reviews
+        ]
+        return [f.result() for f in futuros]
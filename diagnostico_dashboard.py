@@ -8,21 +8,16 @@ import os
 import sys
 from datetime import datetime
 
-# Cargar credenciales desde mis_claves.env
+# Cargar credenciales desde mis_claves.env (mismo loader que regenerate_embeddings.py)
 def load_env_file(filepath):
     """Carga variables de entorno desde un archivo."""
-    try:
-        with open(filepath, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    os.environ[key.strip()] = value.strip().strip('"').strip("'")
-        print(f"✅ Credenciales cargadas desde {filepath}")
-        return True
-    except FileNotFoundError:
+    if not os.path.exists(filepath):
         print(f"❌ No se encontró {filepath}")
         return False
+    from dotenv import load_dotenv
+    load_dotenv(filepath, override=True)
+    print(f"✅ Credenciales cargadas desde {filepath}")
+    return True
 
 # Cargar mis_claves.env primero
 if not load_env_file("mis_claves.env"):
@@ -33,56 +28,65 @@ if not os.getenv("DATABASE_URL"):
     print("❌ DATABASE_URL no encontrada en mis_claves.env")
     sys.exit(1)
 
-from db_utils import get_connection, close_connection
+from db_utils import borrow_conn, close_connection
+
+# Cada diagnóstico es UNA consulta (un round-trip): los agregados van en CTEs y las
+# listas se devuelven como JSON. El script es de solo lectura: no corre DDL.
+def sql_ultimos_7_dias(tabla, columna, suma):
+    """
+    CTE 'dias' con los conteos diarios de los últimos 7 días, leídos en vivo de la
+    tabla base: el filtro sobre la columna sin envolver usa su índice (range scan).
+    """
+    return f"""
+    dias AS (
+        SELECT COALESCE(json_agg(json_build_array(dia, registros, suma) ORDER BY dia DESC), '[]') AS filas
+        FROM (
+            SELECT {columna}::date AS dia, COUNT(*) AS registros, SUM({suma}) AS suma
+            FROM {tabla}
+            WHERE {columna} > NOW() - INTERVAL '7 days'
+            GROUP BY {columna}::date
+        ) x
+    )
+"""
 
-def diagnostico_scraping_logs():
+def diagnostico_scraping_logs(conn):
     """Analiza la tabla scraping_logs."""
-    conn = get_connection()
     if not conn:
         return None
     
     try:
         cursor = conn.cursor()
-        
-        # Estadísticas generales
-        cursor.execute("SELECT COUNT(*) FROM scraping_logs")
-        total = cursor.fetchone()[0]
-        
-        # Fechas extremas
-        cursor.execute("SELECT MIN(fecha), MAX(fecha) FROM scraping_logs")
-        row = cursor.fetchone()
-        fecha_min, fecha_max = row
-        
-        # Registros por estado
-        cursor.execute("""
-            SELECT estado, COUNT(*) 
-            FROM scraping_logs 
-            GROUP BY estado 
-            ORDER BY COUNT(*) DESC
-        """)
-        por_estado = cursor.fetchall()
-        
-        # Últimos 5 registros
-        cursor.execute("""
-            SELECT fecha, url, estado, nuevas_reviews 
-            FROM scraping_logs 
-            ORDER BY fecha DESC 
-            LIMIT 5
-        """)
-        ultimos = cursor.fetchall()
-        
-        # Registros de los últimos 7 días
+    
+        # Totales y fechas extremas, registros por estado, últimos 5 y últimos 7 días
         cursor.execute("""
-            SELECT DATE(fecha), COUNT(*), SUM(nuevas_reviews) 
-            FROM scraping_logs 
-            WHERE fecha > NOW() - INTERVAL '7 days'
-            GROUP BY DATE(fecha) 
-            ORDER BY DATE(fecha) DESC
+            WITH totales AS (
+                SELECT COUNT(*) AS total, MIN(fecha) AS fecha_min, MAX(fecha) AS fecha_max
+                FROM scraping_logs
+            ),
+            por_estado AS (
+                SELECT COALESCE(json_agg(json_build_array(estado, c) ORDER BY c DESC), '[]') AS filas
+                FROM (SELECT estado, COUNT(*) AS c FROM scraping_logs GROUP BY estado) x
+            ),
+            ultimos AS (
+                SELECT COALESCE(json_agg(json_build_array(fecha, url_corta, estado, nuevas_reviews) ORDER BY fecha DESC), '[]') AS filas
+                FROM (
+                    -- Recortar en el servidor: no viajan las URLs completas
+                    SELECT fecha,
+                           LEFT(url, 40) || CASE WHEN length(url) > 40 THEN '...' ELSE '' END AS url_corta,
+                           estado, nuevas_reviews
+                    FROM scraping_logs
+                    ORDER BY fecha DESC
+                    LIMIT 5
+                ) x
+            ),
+        """ + sql_ultimos_7_dias('scraping_logs', 'fecha', 'nuevas_reviews') + """
+            SELECT t.total, t.fecha_min, t.fecha_max, e.filas, u.filas, d.filas
+            FROM totales t, por_estado e, ultimos u, dias d
         """)
-        ultimos_7_dias = cursor.fetchall()
-        
+        total, fecha_min, fecha_max, por_estado, ultimos, ultimos_7_dias = cursor.fetchone()
+    
         cursor.close()
-        
+    
         return {
             'total': total,
             'fecha_min': fecha_min,
@@ -92,61 +96,54 @@ def diagnostico_scraping_logs():
             'ultimos_7_dias': ultimos_7_dias
         }
     except Exception as e:
+        # Dejar la conexión usable para el siguiente diagnóstico
+        conn.rollback()
         print(f"❌ Error: {e}")
         return None
 
-def diagnostico_review_history():
+def diagnostico_review_history(conn):
     """Analiza la tabla review_history."""
-    conn = get_connection()
     if not conn:
         return None
     
     try:
         cursor = conn.cursor()
-        
+    
         # Verificar si existe la tabla
         cursor.execute("SELECT to_regclass('review_history');")
         exists = cursor.fetchone()[0] is not None
-        
+    
         if not exists:
             return {'existe': False}
-        
-        # Estadísticas generales
-        cursor.execute("SELECT COUNT(*) FROM review_history")
-        total = cursor.fetchone()[0]
-        
-        # Fechas extremas
-        cursor.execute("SELECT MIN(recorded_at), MAX(recorded_at) FROM review_history")
-        row = cursor.fetchone()
-        fecha_min, fecha_max = row
-        
-        # Últimos 5 registros
-        cursor.execute("""
-            SELECT recorded_at, nombre, review_count, delta_since_last 
-            FROM review_history 
-            ORDER BY recorded_at DESC 
-            LIMIT 5
-        """)
-        ultimos = cursor.fetchall()
-        
-        # Registros con delta positivo (nuevas reviews detectadas)
-        cursor.execute("""
-            SELECT COUNT(*) FROM review_history WHERE delta_since_last > 0
-        """)
-        con_delta = cursor.fetchone()[0]
-        
-        # Registros de los últimos 7 días
+    
+        # Totales, fechas extremas, registros con delta positivo (nuevas reviews
+        # detectadas), últimos 5 y últimos 7 días
         cursor.execute("""
-            SELECT DATE(recorded_at), COUNT(*), SUM(delta_since_last) 
-            FROM review_history 
-            WHERE recorded_at > NOW() - INTERVAL '7 days'
-            GROUP BY DATE(recorded_at) 
-            ORDER BY DATE(recorded_at) DESC
+            WITH totales AS (
+                SELECT COUNT(*) AS total,
+                       MIN(recorded_at) AS fecha_min, MAX(recorded_at) AS fecha_max,
+                       COUNT(*) FILTER (WHERE delta_since_last > 0) AS con_delta
+                FROM review_history
+            ),
+            ultimos AS (
+                SELECT COALESCE(json_agg(json_build_array(recorded_at, nombre_corto, review_count, delta_since_last) ORDER BY recorded_at DESC), '[]') AS filas
+                FROM (
+                    SELECT recorded_at,
+                           LEFT(nombre, 30) || CASE WHEN length(nombre) > 30 THEN '...' ELSE '' END AS nombre_corto,
+                           review_count, delta_since_last
+                    FROM review_history
+                    ORDER BY recorded_at DESC
+                    LIMIT 5
+                ) x
+            ),
+        """ + sql_ultimos_7_dias('review_history', 'recorded_at', 'delta_since_last') + """
+            SELECT t.total, t.fecha_min, t.fecha_max, t.con_delta, u.filas, d.filas
+            FROM totales t, ultimos u, dias d
         """)
-        ultimos_7_dias = cursor.fetchall()
-        
+        total, fecha_min, fecha_max, con_delta, ultimos, ultimos_7_dias = cursor.fetchone()
+    
         cursor.close()
-        
+    
         return {
             'existe': True,
             'total': total,
@@ -157,47 +154,47 @@ def diagnostico_review_history():
             'ultimos_7_dias': ultimos_7_dias
         }
     except Exception as e:
+        # Dejar la conexión usable para el siguiente diagnóstico
+        conn.rollback()
         print(f"❌ Error: {e}")
         return None
 
-def diagnostico_reviews():
+def diagnostico_reviews(conn):
     """Analiza la tabla reviews (fuente de 'Reseñas 24h')."""
-    conn = get_connection()
     if not conn:
         return None
     
     try:
         cursor = conn.cursor()
         
-        # Total de reviews
-        cursor.execute("SELECT COUNT(*) FROM reviews")
-        total = cursor.fetchone()[0]
-        
-        # Reviews últimas 24h (lo que muestra el dashboard)
-        # fecha_scraping es TEXT, hay que castear
+        # fecha_scraping es TEXT: si ya se corrió migracion_fecha_scraping_ts.sql se usa
+        # la columna fecha_scraping_ts (indexada); si no, el cast en cada fila
         cursor.execute("""
-            SELECT COUNT(*) FROM reviews 
-            WHERE fecha_scraping::timestamp > NOW() - INTERVAL '24 hours'
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'reviews' AND column_name = 'fecha_scraping_ts'
+            )
         """)
-        ultimas_24h = cursor.fetchone()[0]
-        
-        # Fechas extremas
-        cursor.execute("SELECT MIN(fecha_scraping), MAX(fecha_scraping) FROM reviews")
-        row = cursor.fetchone()
-        fecha_min, fecha_max = row
-        
-        # Reviews por día (últimos 7 días)
-        cursor.execute("""
-            SELECT DATE(fecha_scraping::timestamp), COUNT(*) 
-            FROM reviews 
-            WHERE fecha_scraping::timestamp > NOW() - INTERVAL '7 days'
-            GROUP BY DATE(fecha_scraping::timestamp) 
-            ORDER BY DATE(fecha_scraping::timestamp) DESC
+        col_fecha = 'fecha_scraping_ts' if cursor.fetchone()[0] else 'fecha_scraping::timestamp'
+    
+        # Total, reviews últimas 24h (lo que muestra el dashboard), fechas extremas y
+        # reviews por día
+        cursor.execute(f"""
+            WITH totales AS (
+                SELECT COUNT(*) AS total,
+                       COUNT(*) FILTER (WHERE {col_fecha} > NOW() - INTERVAL '24 hours') AS ultimas_24h,
+                       MIN({col_fecha}) AS fecha_min, MAX({col_fecha}) AS fecha_max
+                FROM reviews
+            ),
+        """ + sql_ultimos_7_dias('reviews', col_fecha, 'NULL::bigint') + """
+            SELECT t.total, t.ultimas_24h, t.fecha_min, t.fecha_max, d.filas
+            FROM totales t, dias d
         """)
-        por_dia = cursor.fetchall()
-        
+        total, ultimas_24h, fecha_min, fecha_max, filas = cursor.fetchone()
+        por_dia = [(dia, registros) for dia, registros, _ in filas]
+    
         cursor.close()
-        
+    
         return {
             'total': total,
             'ultimas_24h': ultimas_24h,
@@ -206,6 +203,8 @@ def diagnostico_reviews():
             'por_dia': por_dia
         }
     except Exception as e:
+        # Dejar la conexión usable para el siguiente diagnóstico
+        conn.rollback()
         print(f"❌ Error: {e}")
         return None
 
@@ -216,10 +215,16 @@ def main():
     print(f"Fecha actual: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 60)
     
+    # Los tres diagnósticos son consultas cortas (rangos indexados): comparten una
+    # sola conexión del pool en lugar de abrir tres
+    with borrow_conn() as conn:
+        reviews = diagnostico_reviews(conn)
+        logs = diagnostico_scraping_logs(conn)
+        history = diagnostico_review_history(conn)
+    
     # 0. reviews (fuente del contador "Reseñas 24h")
     print("\n📋 TABLA: reviews (fuente de 'Reseñas 24h')")
     print("-" * 40)
-    reviews = diagnostico_reviews()
     if reviews:
         print(f"   Total registros: {reviews['total']:,}")
         print(f"   🔵 Reviews últimas 24h: {reviews['ultimas_24h']}")
@@ -238,7 +243,6 @@ def main():
     # 1. scraping_logs
     print("\n📋 TABLA: scraping_logs (fuente del gráfico 'Timeline')")
     print("-" * 40)
-    logs = diagnostico_scraping_logs()
     if logs:
         print(f"   Total registros: {logs['total']:,}")
         print(f"   Fecha más antigua: {logs['fecha_min']}")
@@ -249,8 +253,7 @@ def main():
             print(f"      {estado}: {count}")
         
         print("\n   Últimos 5 registros:")
-        for fecha, url, estado, nuevas in logs['ultimos']:
-            url_corta = url[:40] + "..." if url and len(url) > 40 else url
+        for fecha, url_corta, estado, nuevas in logs['ultimos']:
             print(f"      {fecha} | {estado} | nuevas:{nuevas}")
         
         print("\n   Últimos 7 días:")
@@ -265,7 +268,6 @@ def main():
     # 2. review_history
     print("\n📋 TABLA: review_history (fuente del 'Monitor')")
     print("-" * 40)
-    history = diagnostico_review_history()
     if history:
         if not history.get('existe'):
             print("   ⚠️ La tabla NO EXISTE")
@@ -277,8 +279,7 @@ def main():
             
             if history['ultimos']:
                 print("\n   Últimos 5 registros:")
-                for fecha, nombre, count, delta in history['ultimos']:
-                    nombre_corto = nombre[:30] + "..." if nombre and len(nombre) > 30 else nombre
+                for fecha, nombre_corto, count, delta in history['ultimos']:
                     print(f"      {fecha} | {nombre_corto} | reviews:{count} | delta:{delta}")
             
             print("\n   Últimos 7 días:")
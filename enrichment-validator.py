@@ -2,13 +2,22 @@ import time
 import logging
 import csv
 import os
+import re
+import html
+import itertools
+import shutil
+import tempfile
+import threading
+import unicodedata
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import InvalidSessionIdException, TimeoutException
 from openai import OpenAI
 import json
 
@@ -19,6 +28,20 @@ ARCHIVO_VALIDADOS = "lugares_validados.csv"
 ARCHIVO_RECHAZADOS = "lugares_rechazados.csv"
 ARCHIVO_LOG = "logs/enrichment_run.log"
 
+# Navegadores Chrome en paralelo para extraer categorías (cada uno ocupa ~300 MB de RAM)
+MAX_WORKERS_CHROME = int(os.environ.get("ENRICH_WORKERS", 4))
+# Lugares que procesa un navegador antes de recrearlo
+RECICLAR_DRIVER_CADA = int(os.environ.get("ENRICH_RECICLAR", 200))
+# Ritmo global hacia Google Maps (entre todos los workers): 1 request/s, cerca del
+# ritmo secuencial anterior (~3.5 s por lugar); bajarlo con ENRICH_INTERVALO
+INTERVALO_REQUESTS = float(os.environ.get("ENRICH_INTERVALO", 1.0))
+_ritmo_lock = threading.Lock()
+_proximo_turno = 0.0
+# Categorías por llamada al LLM y llamadas simultáneas (con más de ~32 ítems por
+# llamada la clasificación empieza a perder precisión)
+LOTE_CATEGORIAS_LLM = 32
+LLM_CONCURRENCIA = 4
+
 # Crear directorio de logs si no existe
 os.makedirs("logs", exist_ok=True)
 
@@ -37,14 +60,251 @@ logger = logging.getLogger(__name__)
 # Configurar DeepSeek API
 DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY")
 if DEEPSEEK_API_KEY:
+    # El cliente ya reintenta con backoff exponencial (y jitter) ante 429, 5xx,
+    # timeouts y errores de conexión; solo lo que sobrevive a eso llega al fallback
     client = OpenAI(
         api_key=DEEPSEEK_API_KEY,
-        base_url="https://api.deepseek.com"
+        base_url="https://api.deepseek.com",
+        max_retries=5,
+        timeout=120
     )
 else:
     logger.warning("DEEPSEEK_API_KEY no configurada. La validación LLM estará deshabilitada.")
     client = None
 
+# Caches en Supabase de categorías por lugar y de clasificaciones (opcional: sin
+# DATABASE_URL se visita cada lugar y se valida todo con el LLM)
+try:
+    from db_utils import (
+        get_clasificaciones_cacheadas, guardar_clasificaciones,
+        get_categorias_lugares_cacheadas, guardar_categorias_lugares
+    )
+    DB_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"No se pudo importar db_utils: {e}")
+    DB_AVAILABLE = False
+
+
+
+# Selectores de la categoría en la ficha de Google Maps (pueden variar)
+SELECTORES_BOTON_CATEGORIA = (
+    "button[jsaction*='category']",
+    "button.DkEaL",
+    "[data-tooltip='Copiar la categoría']",
+)
+SELECTORES_SPAN_CATEGORIA = ("span.DkEaL", "span.mgr77e")
+SELECTOR_BOTON_CATEGORIA = ", ".join(SELECTORES_BOTON_CATEGORIA)
+SELECTOR_SPAN_CATEGORIA = ", ".join(SELECTORES_SPAN_CATEGORIA)
+SELECTOR_CATEGORIA_CUALQUIERA = ", ".join(SELECTORES_BOTON_CATEGORIA + SELECTORES_SPAN_CATEGORIA)
+
+# Aviso de cerrado en el texto visible, sin serializar todo el HTML ni bajarlo
+# ("ermanently"/"errado" cubren la mayúscula inicial sin copiar el texto en minúsculas)
+_JS_CERRADO = """
+const visible = document.body ? document.body.innerText : "";
+return visible.includes("ermanently closed") || visible.includes("errado permanentemente");
+"""
+
+# Se evalúa en el navegador con (selector_botones, selector_spans)
+_JS_DATOS_CATEGORIA = """
+const elems = [...document.querySelectorAll(arguments[0]), ...document.querySelectorAll(arguments[1])];
+return {
+    textos: elems.map(e => (e.innerText || "").trim()),
+    cerrado: (function () {%s})()
+};
+""" % _JS_CERRADO
+
+# Recursos que Chrome no descarga (imágenes, fuentes, tiles del mapa, analytics)
+URLS_BLOQUEADAS = [
+    "*.png", "*.jpg", "*.jpeg", "*.webp", "*.gif",
+    "*.woff", "*.woff2",
+    "*/maps/vt*",
+    "*/maps/api/js/StaticMapService*",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+]
+
+# Un driver por hilo worker, creado al primer uso; se guardan todos para cerrarlos al final
+_hilo = threading.local()
+_drivers = []
+_drivers_lock = threading.Lock()
+_slots = itertools.count()
+# Directorio temporal (perfil + cache) de cada slot: propio de este proceso, se
+# borra al terminar
+_dirs_temporales = []
+_chromedriver_path = None
+
+
+def crear_driver(dir_trabajo):
+    """
+    Crea un driver de Chrome headless (compatible con GitHub Actions).
+    Perfil y cache de disco van en dir_trabajo (uno por slot/worker), que
+    sobrevive a que se recree el driver: los bundles JS de Maps no se vuelven
+    a descargar.
+    """
+    global _chromedriver_path
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")  # Nuevo modo headless
+    options.add_argument("--no-sandbox")  # Requerido en GitHub Actions
+    options.add_argument("--disable-dev-shm-usage")  # Evita errores de memoria compartida
+    options.add_argument("--disable-gpu")  # Requerido en algunos entornos Linux
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--lang=es-AR")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    # Menos RAM por navegador: sin imágenes (respaldo del bloqueo CDP), sin
+    # servicios de fondo y un único proceso de render
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_argument("--disable-features=Translate,MediaRouter,OptimizationHints")
+    options.add_argument("--renderer-process-limit=1")
+    # Perfil y cache por slot (mkdtemp: no chocan entre workers ni con otro proceso
+    # en el mismo host) y reutilizados al reciclar el driver
+    options.add_argument(f"--user-data-dir={os.path.join(dir_trabajo, 'perfil')}")
+    options.add_argument(f"--disk-cache-dir={os.path.join(dir_trabajo, 'cache')}")
+    options.add_argument("--disk-cache-size=200000000")
+    
+    with _drivers_lock:
+        # Descargar/ubicar chromedriver una sola vez para todos los workers
+        if _chromedriver_path is None:
+            _chromedriver_path = ChromeDriverManager().install()
+    
+    driver = webdriver.Chrome(service=Service(_chromedriver_path), options=options)
+    
+    # Para leer la categoría no hacen falta tiles del mapa ni telemetría
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": False})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": URLS_BLOQUEADAS})
+    except Exception as e:
+        logger.warning(f"No se pudo configurar el bloqueo de recursos vía CDP: {e}")
+    
+    return driver
+
+
+def _driver_del_hilo():
+    """
+    Devuelve el driver del hilo actual, creándolo si hace falta. Cada
+    RECICLAR_DRIVER_CADA usos se recrea: Chrome acumula memoria en corridas largas.
+    """
+    driver = getattr(_hilo, "driver", None)
+    if driver is not None and _hilo.usos >= RECICLAR_DRIVER_CADA:
+        logger.info(f"♻️ Reciclando navegador del worker {_hilo.slot} tras {_hilo.usos} lugares")
+        _descartar_driver_del_hilo()
+        driver = None
+    if driver is None:
+        if getattr(_hilo, "slot", None) is None:
+            with _drivers_lock:
+                _hilo.slot = next(_slots)
+            _hilo.dir_trabajo = tempfile.mkdtemp(prefix=f"chrome-profile-{_hilo.slot}-")
+            with _drivers_lock:
+                _dirs_temporales.append(_hilo.dir_trabajo)
+        driver = crear_driver(_hilo.dir_trabajo)
+        _hilo.driver = driver
+        _hilo.usos = 0
+        with _drivers_lock:
+            _drivers.append(driver)
+    _hilo.usos += 1
+    return driver
+
+
+def _descartar_driver_del_hilo():
+    """Cierra el driver del hilo actual (el próximo uso crea uno nuevo)."""
+    driver = getattr(_hilo, "driver", None)
+    if driver is None:
+        return
+    _hilo.driver = None
+    with _drivers_lock:
+        _drivers.remove(driver)
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+# Camino rápido sin navegador: el HTML inicial de la ficha trae un <meta> de
+# descripción del tipo "★★★★☆ · Restaurante · Dirección"
+_RE_META_DESCRIPCION = re.compile(
+    r'<meta[^>]+(?:property="og:description"|itemprop="description")[^>]*content="([^"]*)"'
+    r'|<meta[^>]+content="([^"]*)"[^>]*(?:property="og:description"|itemprop="description")'
+)
+_RE_ESTRELLAS = re.compile(r'^[★☆\s]+$')
+# Sin pasar el HTML (cientos de KB) a minúsculas dos veces
+_RE_CERRADO = re.compile(r'permanently closed|cerrado permanentemente', re.IGNORECASE)
+_HEADERS_HTTP = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept-Language": "es-AR,es;q=0.9",
+}
+
+
+def _sesion_del_hilo():
+    """Sesión HTTP (keep-alive) propia del hilo actual."""
+    sesion = getattr(_hilo, "sesion", None)
+    if sesion is None:
+        sesion = requests.Session()
+        sesion.headers.update(_HEADERS_HTTP)
+        _hilo.sesion = sesion
+    return sesion
+
+
+def extraer_categoria_http(url):
+    """
+    Intenta obtener la categoría con un GET simple, sin renderizar JavaScript.
+    Retorna (categoria, esta_cerrado) o None si el HTML no alcanza para decidir.
+    """
+    try:
+        resp = _sesion_del_hilo().get(url, timeout=15)
+        resp.raise_for_status()
+    except Exception:
+        return None
+    
+    texto = resp.text
+    esta_cerrado = bool(_RE_CERRADO.search(texto))
+    
+    match = _RE_META_DESCRIPCION.search(texto)
+    if not match:
+        return None
+    partes = [p.strip() for p in html.unescape(match.group(1) or match.group(2)).split("·")]
+    
+    # Solo confiar en el formato esperado: estrellas · categoría (sin números) · ...
+    if len(partes) < 2 or not _RE_ESTRELLAS.match(partes[0]):
+        return None
+    categoria = partes[1]
+    if not categoria or len(categoria) >= 50 or any(c.isdigit() for c in categoria):
+        return None
+    return categoria, esta_cerrado
+
+
+def _esperar_turno():
+    """
+    Limitador compartido por todos los workers: como máximo un request a Google
+    Maps cada INTERVALO_REQUESTS segundos. Solo duerme si el ritmo lo exige.
+    """
+    global _proximo_turno
+    with _ritmo_lock:
+        ahora = time.monotonic()
+        turno = max(ahora, _proximo_turno)
+        _proximo_turno = turno + INTERVALO_REQUESTS
+    if turno > ahora:
+        time.sleep(turno - ahora)
+
+
+def _extraer_categoria_worker(url):
+    """
+    Tarea del pool: primero el camino HTTP; si no alcanza, Selenium con el
+    driver propio del hilo (que solo se crea si hace falta).
+    """
+    _esperar_turno()
+    resultado = extraer_categoria_http(url)
+    if resultado is None:
+        _esperar_turno()
+        try:
+            resultado = extraer_categoria_de_lugar(_driver_del_hilo(), url)
+        except InvalidSessionIdException:
+            # Chrome se cayó: reemplazar el driver y reintentar una vez
+            logger.warning(f"⚠️ Sesión de Chrome perdida, recreando navegador del worker {_hilo.slot}")
+            _descartar_driver_del_hilo()
+            resultado = extraer_categoria_de_lugar(_driver_del_hilo(), url)
+    return resultado
 
 
 def extraer_categoria_de_lugar(driver, url, max_intentos=2):
@@ -55,50 +315,34 @@ def extraer_categoria_de_lugar(driver, url, max_intentos=2):
     for intento in range(max_intentos):
         try:
             driver.get(url)
-            wait = WebDriverWait(driver, 10)
             
-            # Esperar a que cargue la página
-            time.sleep(3)
-            
-            # Verificar si está cerrado permanentemente
-            esta_cerrado = False
+            # Esperar a que aparezca la categoría o el aviso de cerrado (en vez de una
+            # pausa fija): un lugar cerrado sin categoría no agota todo el timeout
             try:
-                page_text = driver.page_source.lower()
-                if "permanently closed" in page_text or "cerrado permanentemente" in page_text:
-                    esta_cerrado = True
-                    logger.info(f"   ⚠️ Lugar cerrado permanentemente detectado")
-            except:
+                WebDriverWait(driver, 10).until(
+                    lambda d: d.find_elements(By.CSS_SELECTOR, SELECTOR_CATEGORIA_CUALQUIERA)
+                    or d.execute_script(_JS_CERRADO)
+                )
+            except TimeoutException:
                 pass
             
-            # Buscar el botón de categoría (puede tener diferentes selectores)
-            selectores = [
-                "button[jsaction*='category']",
-                "button.DkEaL",
-                "[data-tooltip='Copiar la categoría']",
-            ]
-            
-            for selector in selectores:
-                try:
-                    elem = driver.find_element(By.CSS_SELECTOR, selector)
-                    categoria = elem.text.strip()
-                    if categoria:
-                        return categoria, esta_cerrado
-                except:
-                    continue
+            # Un solo round-trip al navegador: textos candidatos (botones primero,
+            # spans de backup) y si la página dice "cerrado permanentemente"
+            datos = driver.execute_script(_JS_DATOS_CATEGORIA, SELECTOR_BOTON_CATEGORIA, SELECTOR_SPAN_CATEGORIA)
+            esta_cerrado = datos["cerrado"]
+            if esta_cerrado:
+                logger.info(f"   ⚠️ Lugar cerrado permanentemente detectado")
             
-            # Backup: buscar en spans con clase específica
-            try:
-                spans = driver.find_elements(By.CSS_SELECTOR, "span.DkEaL, span.mgr77e")
-                for span in spans:
-                    texto = span.text.strip()
-                    if texto and len(texto) < 50:
-                        return texto, esta_cerrado
-            except:
-                pass
+            for texto in datos["textos"]:
+                if texto and len(texto) < 50:
+                    return texto, esta_cerrado
             
             logger.warning(f"No se encontró categoría para: {url}")
             return None, esta_cerrado
             
+        except InvalidSessionIdException:
+            # Navegador muerto: reintentar con este driver no sirve
+            raise
         except Exception as e:
             logger.error(f"Error al extraer categoría (intento {intento + 1}): {e}")
             if intento < max_intentos - 1:
@@ -106,66 +350,168 @@ def extraer_categoria_de_lugar(driver, url, max_intentos=2):
     
     return None, False
 
+# Instrucciones fijas primero y categorías al final: todas las llamadas comparten
+# el mismo prefijo, que la cache de contexto de DeepSeek factura como hit
+PROMPT_SISTEMA_CATEGORIAS = "Eres un asistente que clasifica categorías de establecimientos. Responde SOLO con JSON válido."
+PROMPT_CATEGORIAS = """Analiza cada CATEGORÍA de Google Maps y determina si corresponde a un establecimiento GASTRONÓMICO.
+
+IMPORTANTE: 
+- Responde SOLO con un JSON válido, sin texto adicional.
+- Es gastronómico si su función principal es vender comida o bebidas para consumir.
+- SÍ son gastronómicos: Restaurante, Bar, Cafetería, Heladería, Pizzería, Parrilla, 
+  Hamburguesería, Pub, Cervecería, Pastelería, Rotisería, Sushi, Delivery de comida, etc.
+- NO son gastronómicos: Balneario, Tienda de ropa, Farmacia, Estación de servicio, 
+  Supermercado, Hotel, Agencia de viajes, Gimnasio, Peluquería, Spa, etc.
+
+Responde con este formato JSON exacto:
+{"items": [
+  {"indice": 1, "categoria": "Restaurante", "es_gastronomico": true, "razon": "Vende comida"},
+  {"indice": 2, "categoria": "Balneario", "es_gastronomico": false, "razon": "Es un lugar de recreación, no vende comida"}
+]}
+
+Categorías a analizar:
+"""
+
+# Respaldo si la respuesta no es el objeto esperado: primer "[" hasta el último "]"
+_RE_JSON_ARRAY = re.compile(r'\[.*\]', re.DOTALL)
+
+
+def extraer_json_array(texto):
+    """
+    Extrae la lista de resultados de una respuesta del LLM: {"items": [...]} (modo
+    json_object) o, como respaldo, el primer array JSON del texto.
+    None si no hay uno válido.
+    """
+    try:
+        datos = json.loads(texto or "")
+        if isinstance(datos, dict) and isinstance(datos.get("items"), list):
+            return datos["items"]
+    except ValueError:
+        pass
+    
+    match = _RE_JSON_ARRAY.search(texto or "")
+    if not match:
+        return None
+    try:
+        datos = json.loads(match.group(0))
+    except ValueError:
+        return None
+    return datos if isinstance(datos, list) else None
+
+
+def _normalizar_categoria(categoria):
+    """Minúsculas y sin tildes, para comparar contra los conjuntos de categorías obvias."""
+    return unicodedata.normalize("NFKD", categoria).encode("ascii", "ignore").decode().casefold().strip()
+
+
+# Categorías de Google Maps que no necesitan LLM (comparación exacta tras normalizar)
+CATEGORIAS_GASTRONOMICAS = frozenset(map(_normalizar_categoria, [
+    "Restaurante", "Bar", "Cafetería", "Café", "Heladería", "Pizzería", "Parrilla",
+    "Hamburguesería", "Pub", "Cervecería", "Cervecería artesanal", "Pastelería",
+    "Rotisería", "Restaurante de sushi", "Sushi", "Panadería", "Confitería",
+    "Restaurante de comida rápida", "Restaurante de comida para llevar", "Asador",
+    "Restaurante familiar", "Restaurante italiano", "Restaurante mexicano",
+    "Restaurante vegetariano", "Restaurante vegano", "Bar restaurante", "Vinoteca bar",
+    "Tienda de empanadas", "Cafetería de especialidad", "Casa de té", "Bodegón",
+    "Servicio de catering", "Delivery de comida", "Lomitería", "Tenedor libre",
+]))
+CATEGORIAS_NO_GASTRONOMICAS = frozenset(map(_normalizar_categoria, [
+    "Balneario", "Tienda de ropa", "Farmacia", "Estación de servicio", "Supermercado",
+    "Hotel", "Agencia de viajes", "Gimnasio", "Peluquería", "Spa", "Banco",
+    "Cajero automático", "Hospital", "Clínica", "Escuela", "Iglesia", "Parque",
+    "Ferretería", "Librería", "Tienda de celulares", "Concesionario de automóviles",
+    "Taller mecánico", "Inmobiliaria", "Estudio jurídico", "Centro médico", "Veterinaria",
+]))
+
+
 def validar_categorias_con_llm(categorias_unicas):
     """
     Valida las categorías ÚNICAS con el LLM.
     Retorna un dict {categoria: {"es_valido": bool, "razon": str}}
     
-    Esto es MUCHO más eficiente: en lugar de 1200 llamadas, hacemos 1 sola.
+    Esto es MUCHO más eficiente: en lugar de 1200 llamadas, una por cada lote de categorías.
+    Las categorías obvias (CATEGORIAS_GASTRONOMICAS / CATEGORIAS_NO_GASTRONOMICAS) y las
+    ya clasificadas en corridas anteriores (clasificacion_cache) no van al LLM.
     """
-    if not client:
-        logger.warning("LLM no disponible, marcando todas las categorías como válidas.")
-        return {cat: {"es_valido": True, "razon": "Sin validación LLM"} for cat in categorias_unicas}
-    
     # Filtrar categorías vacías o None
     categorias = [c for c in categorias_unicas if c and c != "Sin categoría"]
     
+    # Categorías obvias: se resuelven con los conjuntos, sin LLM ni cache
+    obvias = {}
+    for cat in categorias:
+        clave = _normalizar_categoria(cat)
+        if clave in CATEGORIAS_GASTRONOMICAS:
+            obvias[cat] = {"es_valido": True, "razon": "Categoría gastronómica conocida"}
+        elif clave in CATEGORIAS_NO_GASTRONOMICAS:
+            obvias[cat] = {"es_valido": False, "razon": "Categoría no gastronómica conocida"}
+    if obvias:
+        logger.info(f"   📋 {len(obvias)} categorías resueltas sin LLM (listas conocidas)")
+        categorias = [c for c in categorias if c not in obvias]
+    
+    cacheadas = get_clasificaciones_cacheadas(categorias) if DB_AVAILABLE else {}
+    if cacheadas:
+        logger.info(f"   ♻️ {len(cacheadas)} categorías ya clasificadas (cache)")
+        categorias = [c for c in categorias if c not in cacheadas]
+    
+    cacheadas.update(obvias)
+    
+    if not client:
+        logger.warning("LLM no disponible, marcando todas las categorías como válidas.")
+        return {**{cat: {"es_valido": True, "razon": "Sin validación LLM"} for cat in categorias_unicas}, **cacheadas}
+    
     if not categorias:
-        logger.warning("No hay categorías para validar")
-        return {}
+        if not cacheadas:
+            logger.warning("No hay categorías para validar")
+        return cacheadas
     
     logger.info(f"Validando {len(categorias)} categorías únicas con LLM...")
     
-    # Construir lista de categorías
-    items = "\n".join([f'{i+1}. "{cat}"' for i, cat in enumerate(categorias)])
+    # Lotes de LOTE_CATEGORIAS_LLM categorías, varios en vuelo a la vez: una sola
+    # llamada con cientos de categorías arriesga cortar la respuesta por max_tokens
+    lotes = [categorias[i:i + LOTE_CATEGORIAS_LLM] for i in range(0, len(categorias), LOTE_CATEGORIAS_LLM)]
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=min(LLM_CONCURRENCIA, len(lotes))) as executor:
+        for parcial in executor.map(_clasificar_lote_llm, lotes):
+            resultados.update(parcial)
     
-    prompt = f"""Analiza cada CATEGORÍA de Google Maps y determina si corresponde a un establecimiento GASTRONÓMICO.
-
-IMPORTANTE: 
-- Responde SOLO con un JSON válido, sin texto adicional.
-- Es gastronómico si su función principal es vender comida o bebidas para consumir.
-- SÍ son gastronómicos: Restaurante, Bar, Cafetería, Heladería, Pizzería, Parrilla, 
-  Hamburguesería, Pub, Cervecería, Pastelería, Rotisería, Sushi, Delivery de comida, etc.
-- NO son gastronómicos: Balneario, Tienda de ropa, Farmacia, Estación de servicio, 
-  Supermercado, Hotel, Agencia de viajes, Gimnasio, Peluquería, Spa, etc.
+    validados = {cat: r for cat, r in resultados.items() if not r.pop("por_error", False)}
+    logger.info(f"   ✓ {sum(1 for r in resultados.values() if r['es_valido'])} categorías gastronómicas")
+    logger.info(f"   ✗ {sum(1 for r in resultados.values() if not r['es_valido'])} categorías no gastronómicas")
+    
+    # Solo se cachean las clasificaciones reales, no las marcadas válidas por error
+    if DB_AVAILABLE and validados:
+        guardar_clasificaciones(validados)
+    
+    return {**resultados, **cacheadas}
 
-Categorías a analizar:
-{items}
 
-Responde con este formato JSON exacto:
-[
-  {{"indice": 1, "categoria": "Restaurante", "es_gastronomico": true, "razon": "Vende comida"}},
-  {{"indice": 2, "categoria": "Balneario", "es_gastronomico": false, "razon": "Es un lugar de recreación, no vende comida"}}
-]"""
+def _clasificar_lote_llm(categorias):
+    """Clasifica un lote de categorías con una llamada al LLM."""
+    # Construir lista de categorías (lo único que cambia entre llamadas)
+    items = "\n".join([f'{i+1}. "{cat}"' for i, cat in enumerate(categorias)])
+    prompt = PROMPT_CATEGORIAS + items
 
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "Eres un asistente que clasifica categorías de establecimientos. Responde SOLO con JSON válido."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1
-        )
-        texto = response.choices[0].message.content.strip()
-        
-        # Limpiar markdown si viene
-        if texto.startswith("```"):
-            texto = texto.split("```")[1]
-            if texto.startswith("json"):
-                texto = texto[4:]
+        validaciones = None
+        # Si la respuesta no es JSON válido, se reintenta una vez con temperature=0
+        for temperatura in (0.1, 0):
+            response = client.chat.completions.create(
+                model="deepseek-chat",
+                messages=[
+                    {"role": "system", "content": PROMPT_SISTEMA_CATEGORIAS},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=temperatura,
+                # Modo JSON de la API: la respuesta es siempre un objeto JSON válido
+                response_format={"type": "json_object"}
+            )
+            validaciones = extraer_json_array(response.choices[0].message.content)
+            if validaciones is not None:
+                break
+            logger.warning(f"Respuesta LLM sin JSON válido (temperature={temperatura})")
         
-        validaciones = json.loads(texto)
+        if validaciones is None:
+            raise ValueError("El LLM no devolvió un JSON válido tras reintentar")
         
         # Construir dict de resultados
         resultados = {}
@@ -178,163 +524,178 @@ Responde con este formato JSON exacto:
                     "razon": v["razon"]
                 }
         
-        logger.info(f"   ✓ {sum(1 for r in resultados.values() if r['es_valido'])} categorías gastronómicas")
-        logger.info(f"   ✗ {sum(1 for r in resultados.values() if not r['es_valido'])} categorías no gastronómicas")
-        
         return resultados
                 
     except Exception as e:
-        logger.error(f"Error en validación LLM: {e}")
+        logger.error(f"Error en validación LLM ({len(categorias)} categorías, tras reintentos): {e}")
         # En caso de error, marcar todas como válidas para no perder datos
-        return {cat: {"es_valido": True, "razon": "Error LLM - marcado como válido"} for cat in categorias}
+        return {cat: {"es_valido": True, "razon": "Error LLM - marcado como válido", "por_error": True} for cat in categorias}
+
+
 
 
+def leer_lugares():
+    """Recorre el CSV de entrada fila por fila (generador, sin cargarlo entero)."""
+    with open(ARCHIVO_ENTRADA, 'r', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
 
 
 def procesar_lugares():
     """
     Proceso principal: lee CSV, extrae categorías, valida con LLM, guarda resultados.
+    
+    En memoria solo queda (categoria, esta_cerrado) por lugar: el CSV se recorre una vez
+    para extraer categorías y otra para escribir los resultados fila por fila.
     """
-    # Leer lugares del CSV
-    lugares = []
-    try:
-        with open(ARCHIVO_ENTRADA, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            lugares = list(reader)
-        logger.info(f"Leídos {len(lugares)} lugares del CSV.")
-    except FileNotFoundError:
+    if not os.path.exists(ARCHIVO_ENTRADA):
         logger.error(f"No se encontró el archivo {ARCHIVO_ENTRADA}")
         return
     
-    if not lugares:
-        logger.warning("No hay lugares para procesar.")
-        return
-    
-    # Configurar navegador (compatible con GitHub Actions)
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless=new")  # Nuevo modo headless
-    options.add_argument("--no-sandbox")  # Requerido en GitHub Actions
-    options.add_argument("--disable-dev-shm-usage")  # Evita errores de memoria compartida
-    options.add_argument("--disable-gpu")  # Requerido en algunos entornos Linux
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--lang=es-AR")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-
-    
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    
+    resultados = {}
     try:
-        # Etapa 1: Extraer categorías
+        # Etapa 1: Extraer categorías (varios Chrome en paralelo)
         logger.info("=" * 50)
-        logger.info("ETAPA 1: Extrayendo categorías de Google Maps")
+        logger.info(f"ETAPA 1: Extrayendo categorías de Google Maps ({MAX_WORKERS_CHROME} navegadores)")
         logger.info("=" * 50)
         
-        lugares_con_categoria = []
-        lugares_cerrados = []
+        # Un mismo link puede venir de varias queries: se visita una sola vez y
+        # las repeticiones copian el resultado de la primera aparición
+        primera_aparicion = {}
+        repetidos = {}
+        pendientes = []
+        for i, lugar in enumerate(leer_lugares()):
+            link = lugar["link"]
+            if link in primera_aparicion:
+                repetidos[i] = primera_aparicion[link]
+                continue
+            primera_aparicion[link] = i
+            pendientes.append((i, link, lugar["nombre"]))
         
-        for i, lugar in enumerate(lugares, 1):
-            logger.info(f"Procesando {i}/{len(lugares)}: {lugar['nombre'][:40]}...")
-            
-            categoria, esta_cerrado = extraer_categoria_de_lugar(driver, lugar["link"])
-            
-            if esta_cerrado:
-                # Lugar cerrado permanentemente - rechazar directamente
-                lugares_cerrados.append({
-                    **lugar,
-                    "categoria": categoria or "Desconocida",
-                    "razon_rechazo": "Lugar cerrado permanentemente"
-                })
-                logger.info(f"   ❌ Rechazado: Cerrado permanentemente")
-            else:
-                lugares_con_categoria.append({
-                    **lugar,
-                    "categoria": categoria or "Sin categoría"
-                })
+        # Lugares ya visitados en corridas recientes (solo los links de este CSV):
+        # no se vuelve a Google Maps
+        cacheadas = get_categorias_lugares_cacheadas(list(primera_aparicion)) if DB_AVAILABLE else {}
+        nuevas = {}
+        
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS_CHROME) as executor:
+            futuros = {}
+            for i, link, nombre in pendientes:
+                if link in cacheadas:
+                    resultados[i] = cacheadas[link]
+                else:
+                    futuros[executor.submit(_extraer_categoria_worker, link)] = (i, link, nombre)
+            total = len(futuros)
+            logger.info(
+                f"Leídos {len(primera_aparicion) + len(repetidos)} lugares del CSV "
+                f"({len(repetidos)} links repetidos, {len(resultados)} en cache)."
+            )
+            del cacheadas, primera_aparicion, pendientes
             
-            time.sleep(0.5)  # Pausa entre requests
-
+            for completados, futuro in enumerate(as_completed(futuros), 1):
+                i, link, nombre = futuros[futuro]
+                try:
+                    resultados[i] = futuro.result()
+                    categoria, esta_cerrado = resultados[i]
+                    # Solo se cachean extracciones concluyentes
+                    if categoria or esta_cerrado:
+                        nuevas[link] = resultados[i]
+                except Exception as e:
+                    logger.error(f"Error al extraer categoría de {link}: {e}")
+                    resultados[i] = (None, False)
+                logger.info(f"Procesado {completados}/{total}: {nombre[:40]}...")
+            del futuros
+        
+        if DB_AVAILABLE and nuevas:
+            guardar_categorias_lugares(nuevas)
         
+        for i, i_original in repetidos.items():
+            resultados[i] = resultados[i_original]
     finally:
-        driver.quit()
+        for driver in _drivers:
+            try:
+                driver.quit()
+            except:
+                pass
+        # Con los navegadores cerrados ya se pueden borrar perfiles y caches
+        for dir_trabajo in _dirs_temporales:
+            shutil.rmtree(dir_trabajo, ignore_errors=True)
+    
+    if not resultados:
+        logger.warning("No hay lugares para procesar.")
+        return
     
     # Etapa 2: Validar CATEGORÍAS ÚNICAS con LLM (¡mucho más eficiente!)
     logger.info("=" * 50)
     logger.info("ETAPA 2: Validando CATEGORÍAS ÚNICAS con LLM")
     logger.info("=" * 50)
     
-    # Extraer categorías únicas
-    categorias_unicas = set(l["categoria"] for l in lugares_con_categoria)
+    # Extraer categorías únicas (de los lugares abiertos)
+    categorias_unicas = {categoria or "Sin categoría" for categoria, esta_cerrado in resultados.values() if not esta_cerrado}
     logger.info(f"Categorías únicas encontradas: {len(categorias_unicas)}")
     
     # Validar categorías (1 sola llamada al LLM)
     validaciones_categorias = validar_categorias_con_llm(categorias_unicas)
     
-    # Etapa 3: Separar y guardar resultados
+    # Etapa 3: Separar y guardar resultados (escritura incremental, fila por fila)
     logger.info("=" * 50)
     logger.info("ETAPA 3: Guardando resultados")
     logger.info("=" * 50)
     
-    validados = []
-    rechazados = []
     timestamp = datetime.now().isoformat()
+    n_validados = 0
+    n_rechazados = 0
+    n_cerrados = 0
     
-    # Agregar lugares cerrados a rechazados
-    for lugar_cerrado in lugares_cerrados:
-        registro = {
-            "link": lugar_cerrado["link"],
-            "nombre": lugar_cerrado["nombre"],
-            "categoria": lugar_cerrado["categoria"],
-            "razon_rechazo": lugar_cerrado["razon_rechazo"],
-            "query_original": lugar_cerrado.get("query", ""),
-            "fecha_scraping": lugar_cerrado.get("fecha_busqueda", ""),
-            "fecha_validacion": timestamp,
-        }
-        rechazados.append(registro)
-    
-    # Aplicar validación de categoría a cada lugar
-    for lugar in lugares_con_categoria:
-        categoria = lugar["categoria"]
-        # Buscar validación de esta categoría
-        validacion = validaciones_categorias.get(categoria, {"es_valido": True, "razon": "Categoría no validada"})
-
-        
-        registro = {
-            "link": lugar["link"],
-            "nombre": lugar["nombre"],
-            "categoria": lugar["categoria"],
-            "query_original": lugar.get("query", ""),
-            "fecha_scraping": lugar.get("fecha_busqueda", ""),
-            "fecha_validacion": timestamp,
-        }
+    campos_validados = ["link", "nombre", "categoria", "query_original", "fecha_scraping", "fecha_validacion"]
+    campos_rechazados = ["link", "nombre", "categoria", "razon_rechazo", "query_original", "fecha_scraping", "fecha_validacion"]
+    
+    with open(ARCHIVO_VALIDADOS, 'w', newline='', encoding='utf-8') as f_val, \
+         open(ARCHIVO_RECHAZADOS, 'w', newline='', encoding='utf-8') as f_rech:
+        writer_validados = csv.DictWriter(f_val, fieldnames=campos_validados)
+        writer_rechazados = csv.DictWriter(f_rech, fieldnames=campos_rechazados)
+        writer_validados.writeheader()
+        writer_rechazados.writeheader()
         
-        if validacion["es_valido"]:
-            validados.append(registro)
-        else:
-            registro["razon_rechazo"] = validacion["razon"]
-            rechazados.append(registro)
-    
-    # Guardar validados
-    with open(ARCHIVO_VALIDADOS, 'w', newline='', encoding='utf-8') as f:
-        campos = ["link", "nombre", "categoria", "query_original", "fecha_scraping", "fecha_validacion"]
-        writer = csv.DictWriter(f, fieldnames=campos)
-        writer.writeheader()
-        writer.writerows(validados)
-    
-    # Guardar rechazados
-    with open(ARCHIVO_RECHAZADOS, 'w', newline='', encoding='utf-8') as f:
-        campos = ["link", "nombre", "categoria", "razon_rechazo", "query_original", "fecha_scraping", "fecha_validacion"]
-        writer = csv.DictWriter(f, fieldnames=campos)
-        writer.writeheader()
-        writer.writerows(rechazados)
+        for i, lugar in enumerate(leer_lugares()):
+            categoria, esta_cerrado = resultados.get(i, (None, False))
+            
+            registro = {
+                "link": lugar["link"],
+                "nombre": lugar["nombre"],
+                "query_original": lugar.get("query", ""),
+                "fecha_scraping": lugar.get("fecha_busqueda", ""),
+                "fecha_validacion": timestamp,
+            }
+            
+            if esta_cerrado:
+                # Lugar cerrado permanentemente - rechazar directamente
+                registro["categoria"] = categoria or "Desconocida"
+                registro["razon_rechazo"] = "Lugar cerrado permanentemente"
+                writer_rechazados.writerow(registro)
+                n_cerrados += 1
+                n_rechazados += 1
+                logger.info(f"   ❌ Rechazado: {lugar['nombre'][:40]} (cerrado permanentemente)")
+                continue
+            
+            # Buscar validación de esta categoría
+            registro["categoria"] = categoria or "Sin categoría"
+            validacion = validaciones_categorias.get(registro["categoria"], {"es_valido": True, "razon": "Categoría no validada"})
+            
+            if validacion["es_valido"]:
+                writer_validados.writerow(registro)
+                n_validados += 1
+            else:
+                registro["razon_rechazo"] = validacion["razon"]
+                writer_rechazados.writerow(registro)
+                n_rechazados += 1
     
     # Resumen
     logger.info("=" * 50)
     logger.info("RESUMEN DE VALIDACIÓN")
     logger.info("=" * 50)
-    logger.info(f"Total procesados: {len(lugares)}")
-    logger.info(f"Cerrados permanentemente: {len(lugares_cerrados)}")
-    logger.info(f"Lugares VALIDADOS: {len(validados)}")
-    logger.info(f"Lugares RECHAZADOS: {len(rechazados)}")
+    logger.info(f"Total procesados: {len(resultados)}")
+    logger.info(f"Cerrados permanentemente: {n_cerrados}")
+    logger.info(f"Lugares VALIDADOS: {n_validados}")
+    logger.info(f"Lugares RECHAZADOS: {n_rechazados}")
     logger.info(f"Archivo validados: {ARCHIVO_VALIDADOS}")
     logger.info(f"Archivo rechazados: {ARCHIVO_RECHAZADOS}")
     logger.info("=" * 50)
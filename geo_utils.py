@@ -1,5 +1,11 @@
+import io
 import re
+import time
 import logging
+from functools import lru_cache
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import geopandas as gpd
 from shapely.geometry import Point
 import pandas as pd
@@ -9,43 +15,63 @@ logger = logging.getLogger(__name__)
 # Cache para el GeoDataFrame de barrios
 _GDF_BARRIOS = None
 
-from asignar_barrios import ZONAS_MAP, BARRIOS_RIO
+# Sesión HTTP compartida por el proceso (keep-alive + reintentos)
+_HTTP_SESSION = None
+
+# Coordenadas en URLs de Google Maps, en una sola pasada: "@lat,lon[,zoom]" (en el
+# path, antes de /data=) o "!3dlat!4dlon" (dentro de data=)
+_RE_COORDS = re.compile(
+    r'@(?P<lat>-?\d+\.\d+),(?P<lon>-?\d+\.\d+)'
+    r'|!3d(?P<lat_data>-?\d+\.\d+)!4d(?P<lon_data>-?\d+\.\d+)'
+)
+
+from asignar_barrios import BARRIO_META_NORM, normalizar_barrio, CACHE_DIR, CACHE_MAX_EDAD_SEG
+
+# Cache local del mapa ya descargado y reproyectado a lat/lon (GeoParquet)
+CACHE_BARRIOS_4326 = CACHE_DIR / 'barrios_4326.parquet'
+
 
 def extraer_coordenadas_url(url):
     """Extrae latitud y longitud de una URL de Google Maps"""
     if not url:
         return None, None
         
-    # Patrón 1: @lat,lon,zoom
-    patron = r'@(-?\d+\.\d+),(-?\d+\.\d+),\d+\.?\d*z?'
-    match = re.search(patron, url)
+    match = _RE_COORDS.search(url)
     if match:
-        return float(match.group(1)), float(match.group(2))
-    
-    # Patrón 2: @lat,lon (sin zoom)
-    patron_alt = r'@(-?\d+\.\d+),(-?\d+\.\d+)'
-    match_alt = re.search(patron_alt, url)
-    if match_alt:
-        return float(match_alt.group(1)), float(match_alt.group(2))
-    
-    # Patrón 3: !3dlat!4dlon
-    patron_data = r'!3d(-?\d+\.\d+)!4d(-?\d+\.\d+)'
-    match_data = re.search(patron_data, url)
-    if match_data:
-        return float(match_data.group(1)), float(match_data.group(2))
+        return float(match.group('lat') or match.group('lat_data')), float(match.group('lon') or match.group('lon_data'))
     
     return None, None
 
+def _get_http_session():
+    """Devuelve la sesión HTTP del proceso, con reintentos ante errores transitorios."""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504))
+        _HTTP_SESSION = requests.Session()
+        _HTTP_SESSION.mount('https://', HTTPAdapter(max_retries=retry))
+    return _HTTP_SESSION
+
 def _cargar_barrios():
     """Carga y cachea el GeoDataFrame de barrios."""
     global _GDF_BARRIOS
     if _GDF_BARRIOS is not None:
         return _GDF_BARRIOS
         
+    if CACHE_BARRIOS_4326.exists() and time.time() - CACHE_BARRIOS_4326.stat().st_mtime < CACHE_MAX_EDAD_SEG:
+        try:
+            _GDF_BARRIOS = gpd.read_parquet(CACHE_BARRIOS_4326)
+            _GDF_BARRIOS.sindex
+            logger.info("📦 Mapa de barrios cargado desde cache local")
+            return _GDF_BARRIOS
+        except Exception as e:
+            logger.warning(f"   ⚠️ Cache de barrios inválido, se descarga de nuevo: {e}")
+        
     url_geojson = 'https://www.estadisticaneuquen.gob.ar/apps/barrios/shapeBarrios.json'
     try:
         logger.info("🌐 Descargando mapa de barrios de Neuquén...")
-        gdf = gpd.read_file(url_geojson)
+        resp = _get_http_session().get(url_geojson, timeout=30)
+        resp.raise_for_status()
+        gdf = gpd.read_file(io.BytesIO(resp.content), engine="pyogrio")
         
         # Corrección de CRS: Viene en Web Mercator (3857), pasar a Lat/Lon (4326)
         if gdf.crs and gdf.crs.to_epsg() != 4326:
@@ -56,7 +82,16 @@ def _cargar_barrios():
             gdf = gdf.to_crs(epsg=4326)
             
         _GDF_BARRIOS = gdf[['NOMBRE', 'geometry']].rename(columns={'NOMBRE': 'barrio_oficial'})
+        # Construir el STRtree una sola vez (geopandas lo cachea en el GeoDataFrame)
+        _GDF_BARRIOS.sindex
         logger.info("   ✅ Mapa cargado y procesado.")
+        
+        # Guardar cache para los próximos procesos (sin descarga ni reproyección)
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            _GDF_BARRIOS.to_parquet(CACHE_BARRIOS_4326)
+        except Exception as e:
+            logger.warning(f"   ⚠️ No se pudo guardar cache de barrios: {e}")
         return _GDF_BARRIOS
     except Exception as e:
         logger.error(f"   ❌ Error cargando mapa de barrios: {e}")
@@ -76,29 +111,76 @@ def asignar_barrio(lat, lon):
     if lat is None or lon is None:
         return resultado
         
-    gdf_barrios = _cargar_barrios()
-    if gdf_barrios is None:
+    if _cargar_barrios() is None:
         return resultado
         
     try:
-        punto = Point(lon, lat)  # Ojo: Point es (x, y) = (lon, lat)
-        
-        # Buscar en qué polígono cae el punto
-        # Usamos check simple iterando si son pocos, o sjoin si fuera masivo.
-        # Al ser un solo punto a la vez, iterar es rápido y evita crear GDF del punto.
-        
-        barrio_encontrado = None
-        for idx, row in gdf_barrios.iterrows():
-            if row.geometry.contains(punto):
-                barrio_encontrado = row['barrio_oficial']
-                break
-        
-        if barrio_encontrado:
-            resultado['barrio'] = barrio_encontrado
-            resultado['zona'] = ZONAS_MAP.get(barrio_encontrado, 'Otras Zonas')
-            resultado['cerca_rio'] = barrio_encontrado in BARRIOS_RIO
+        # Redondeo a 1e-5 grados (~1 m): el mismo lugar (o vecinos de cuadra)
+        # reutiliza la búsqueda anterior
+        barrio, zona, cerca_rio = _barrio_de_punto(round(lat, 5), round(lon, 5))
+        if barrio:
+            resultado['barrio'] = barrio
+            resultado['zona'] = zona
+            resultado['cerca_rio'] = cerca_rio
             
     except Exception as e:
         logger.warning(f"Error asignando barrio para ({lat}, {lon}): {e}")
         
     return resultado
+
+
+@lru_cache(maxsize=4096)
+def _barrio_de_punto(lat, lon):
+    """(barrio, zona, cerca_rio) para un punto; requiere los barrios ya cargados."""
+    gdf_barrios = _GDF_BARRIOS
+    punto = Point(lon, lat)  # Ojo: Point es (x, y) = (lon, lat)
+    
+    # Buscar en qué polígono cae el punto con el índice espacial (STRtree) del
+    # GeoDataFrame: descarta por bounding box y solo prueba los candidatos
+    hits = gdf_barrios.sindex.query(punto, predicate="within")
+    if not len(hits):
+        return None, 'Otras Zonas', False
+    
+    barrio = gdf_barrios['barrio_oficial'].iat[hits.min()]
+    zona, cerca_rio = BARRIO_META_NORM.get(normalizar_barrio(barrio), ('Otras Zonas', False))
+    return barrio, zona, cerca_rio
+
+
+def asignar_barrios_batch(lats, lons):
+    """
+    Versión en lote de asignar_barrio: una sola consulta al índice espacial para
+    todos los puntos. Retorna una lista de diccionarios (mismo orden que la entrada).
+    """
+    resultados = [{'barrio': None, 'zona': 'Otras Zonas', 'cerca_rio': False} for _ in lats]
+    
+    validos = [i for i, (lat, lon) in enumerate(zip(lats, lons)) if lat is not None and lon is not None]
+    if not validos:
+        return resultados
+    
+    gdf_barrios = _cargar_barrios()
+    if gdf_barrios is None:
+        return resultados
+    
+    try:
+        puntos = gpd.points_from_xy([lons[i] for i in validos], [lats[i] for i in validos])
+        # Pares (índice de punto, índice de barrio); con polígonos superpuestos gana
+        # el primer barrio, igual que en asignar_barrio
+        idx_puntos, idx_barrios = gdf_barrios.sindex.query(puntos, predicate="within")
+        nombres = gdf_barrios['barrio_oficial'].to_numpy()
+        asignados = {}
+        for i_punto, i_barrio in zip(idx_puntos, idx_barrios):
+            if i_punto not in asignados or i_barrio < asignados[i_punto]:
+                asignados[i_punto] = i_barrio
+        
+        for i_punto, i_barrio in asignados.items():
+            barrio = nombres[i_barrio]
+            zona, cerca_rio = BARRIO_META_NORM.get(normalizar_barrio(barrio), ('Otras Zonas', False))
+            resultados[validos[i_punto]] = {
+                'barrio': barrio,
+                'zona': zona,
+                'cerca_rio': cerca_rio
+            }
+    except Exception as e:
+        logger.warning(f"Error asignando barrios en lote ({len(validos)} puntos): {e}")
+    
+    return resultados
@@ -0,0 +1,90 @@
+-- ============================================================
+-- MIGRACIÓN: Huella de deduplicación de reviews (texto_fp) + índice único
+-- Fecha: 2026-10-16
+-- ============================================================
+-- INSTRUCCIONES:
+-- 1. Correr este script en el SQL Editor de Supabase, UNA sola vez
+-- 2. Ejecutar cada sección por separado para verificar
+-- 3. Conviene hacerlo con los scrapers/monitor detenidos (el PASO 1
+--    reescribe la tabla reviews con un lock exclusivo)
+--
+-- db_utils.detectar_dedup_reviews() solo lee el catálogo: hasta que no se
+-- corra esta migración, los inserts deduplican con el SELECT previo de
+-- huellas (calculadas al vuelo) y sin índice.
+-- ============================================================
+
+-- ============================================================
+-- PASO 1: Columna generada texto_fp
+-- ============================================================
+-- md5 de los primeros 50 caracteres del texto normalizado (minúsculas,
+-- espacios colapsados). Debe ser idéntica a _TEXTO_FP_SQL en db_utils.py.
+
+ALTER TABLE reviews
+ADD COLUMN IF NOT EXISTS texto_fp TEXT
+GENERATED ALWAYS AS (
+    md5(left(btrim(regexp_replace(lower(left(coalesce(texto, ''), 100)), '\s+', ' ', 'g')), 50))
+) STORED;
+
+-- ============================================================
+-- PASO 2: Diagnóstico de duplicados históricos (SOLO LECTURA)
+-- ============================================================
+
+SELECT COUNT(*) AS filas_duplicadas
+FROM (
+    SELECT row_number() OVER (
+               PARTITION BY restaurante, LOWER(TRIM(autor)), texto_fp
+               ORDER BY fecha_scraping, ctid
+           ) AS rn
+    FROM reviews
+    WHERE restaurante IS NOT NULL AND autor IS NOT NULL
+) x
+WHERE rn > 1;
+
+-- ============================================================
+-- PASO 3: Borrar duplicados (se conserva la review más antigua)
+-- ============================================================
+
+DELETE FROM reviews
+WHERE ctid IN (
+    SELECT ctid
+    FROM (
+        SELECT ctid,
+               row_number() OVER (
+                   PARTITION BY restaurante, LOWER(TRIM(autor)), texto_fp
+                   ORDER BY fecha_scraping, ctid
+               ) AS rn
+        FROM reviews
+        WHERE restaurante IS NOT NULL AND autor IS NOT NULL
+    ) x
+    WHERE rn > 1
+);
+
+-- ============================================================
+-- PASO 4: Índice único (sin bloquear escrituras)
+-- ============================================================
+-- ⚠️ CONCURRENTLY no puede ir dentro de una transacción: ejecutar esta
+-- sentencia sola. Si falla queda un índice INVALID: borrarlo con
+-- DROP INDEX CONCURRENTLY idx_reviews_dedup_fp_unico; y repetir PASO 3-4.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_reviews_dedup_fp_unico
+ON reviews (restaurante, LOWER(TRIM(autor)), texto_fp);
+
+-- Índice común de versiones anteriores (redundante con el único)
+DROP INDEX CONCURRENTLY IF EXISTS idx_reviews_dedup_fp;
+
+-- ============================================================
+-- PASO 5: Verificación final
+-- ============================================================
+-- indisvalid debe ser true
+
+SELECT c.relname AS indice, i.indisvalid
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+WHERE c.relname = 'idx_reviews_dedup_fp_unico';
+
+-- ============================================================
+-- ROLLBACK (si hiciera falta)
+-- ============================================================
+-- DROP INDEX CONCURRENTLY IF EXISTS idx_reviews_dedup_fp_unico;
+-- ALTER TABLE reviews DROP COLUMN IF EXISTS texto_fp;
+-- (los duplicados borrados en el PASO 3 no se recuperan)
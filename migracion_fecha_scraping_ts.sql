@@ -0,0 +1,94 @@
+-- ============================================================
+-- MIGRACIÓN: Columna reviews.fecha_scraping_ts (timestamp indexado)
+-- Fecha: 2026-10-16
+-- ============================================================
+-- INSTRUCCIONES:
+-- 1. Correr este script en el SQL Editor de Supabase, UNA sola vez
+-- 2. Ejecutar cada sección por separado para verificar
+--
+-- fecha_scraping es TEXT: filtrar/agrupar por fecha obliga a castear en cada
+-- consulta (sin índice). Esta columna guarda el timestamp ya convertido.
+-- La llena un trigger (no una columna generada): el cast de texto depende de
+-- DateStyle, así que no es IMMUTABLE, y un valor no ISO no debe hacer fallar
+-- el INSERT: queda NULL. diagnostico_dashboard.py la usa si existe.
+-- ============================================================
+
+-- ============================================================
+-- PASO 1: Columna (sin default: no reescribe la tabla)
+-- ============================================================
+
+ALTER TABLE reviews
+ADD COLUMN IF NOT EXISTS fecha_scraping_ts TIMESTAMP;
+
+-- Si una versión anterior la creó como columna generada (iso_a_timestamp),
+-- pasarla a columna común conservando los valores (PostgreSQL 13+)
+ALTER TABLE reviews
+ALTER COLUMN fecha_scraping_ts DROP EXPRESSION IF EXISTS;
+
+DROP FUNCTION IF EXISTS iso_a_timestamp(TEXT);
+
+-- ============================================================
+-- PASO 2: Conversión tolerante + trigger
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION fecha_scraping_a_ts(texto TEXT) RETURNS TIMESTAMP
+LANGUAGE plpgsql STABLE
+AS $$
+BEGIN
+    RETURN NULLIF(texto, '')::timestamp;
+EXCEPTION WHEN others THEN
+    RETURN NULL;  -- Formato no reconocido: no bloquear el INSERT
+END
+$$;
+
+CREATE OR REPLACE FUNCTION reviews_set_fecha_scraping_ts() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.fecha_scraping_ts := fecha_scraping_a_ts(NEW.fecha_scraping);
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_reviews_fecha_scraping_ts ON reviews;
+CREATE TRIGGER trg_reviews_fecha_scraping_ts
+BEFORE INSERT OR UPDATE OF fecha_scraping ON reviews
+FOR EACH ROW EXECUTE FUNCTION reviews_set_fecha_scraping_ts();
+
+-- ============================================================
+-- PASO 3: Completar las filas existentes
+-- ============================================================
+
+UPDATE reviews
+SET fecha_scraping_ts = fecha_scraping_a_ts(fecha_scraping)
+WHERE fecha_scraping_ts IS NULL
+  AND fecha_scraping IS NOT NULL;
+
+-- ============================================================
+-- PASO 4: Índice (sin bloquear escrituras)
+-- ============================================================
+-- ⚠️ CONCURRENTLY no puede ir dentro de una transacción: ejecutar esta
+-- sentencia sola
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reviews_fecha_scraping_ts
+ON reviews (fecha_scraping_ts DESC);
+
+-- ============================================================
+-- PASO 5: Verificación final
+-- ============================================================
+-- "Sin convertir" son fechas con formato no reconocido (quedan NULL)
+
+SELECT
+    COUNT(*) FILTER (WHERE fecha_scraping_ts IS NOT NULL) AS "Con fecha_scraping_ts",
+    COUNT(*) FILTER (WHERE fecha_scraping_ts IS NULL AND fecha_scraping IS NOT NULL) AS "Sin convertir",
+    COUNT(*) AS "Total"
+FROM reviews;
+
+-- ============================================================
+-- ROLLBACK (si hiciera falta)
+-- ============================================================
+-- DROP TRIGGER IF EXISTS trg_reviews_fecha_scraping_ts ON reviews;
+-- DROP FUNCTION IF EXISTS reviews_set_fecha_scraping_ts();
+-- DROP FUNCTION IF EXISTS fecha_scraping_a_ts(TEXT);
+-- DROP INDEX CONCURRENTLY IF EXISTS idx_reviews_fecha_scraping_ts;
+-- ALTER TABLE reviews DROP COLUMN IF EXISTS fecha_scraping_ts;
@@ -5,12 +5,16 @@ Verifica cambios en el conteo de reseñas y scrapea las nuevas.
 import time
 import logging
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from db_utils import (
     get_lugares_para_monitoreo, 
+    liberar_lugares_monitoreo,
     upsert_lugar, 
     get_ultimas_N_reviews_restaurante,
     insertar_reviews_batch,
@@ -42,6 +46,29 @@ MAX_RUNTIME_SECONDS = MAX_RUNTIME_HOURS * 3600
 # Máximo de reseñas a cargar por lugar (para limitar scroll)
 MAX_REVIEWS_POR_LUGAR = 100
 
+# Navegadores Chrome en paralelo (cada uno con su driver); el runner de GitHub
+# Actions tiene 2 vCPU y 7 GB de RAM
+MONITOR_WORKERS = int(os.getenv("MONITOR_WORKERS", 2))
+
+# crear_driver instala/ubica chromedriver: no hacerlo desde dos hilos a la vez
+_crear_driver_lock = threading.Lock()
+
+
+def _crear_driver_serializado():
+    with _crear_driver_lock:
+        return crear_driver()
+
+
+# Separación mínima entre navegaciones de un mismo worker (segundos)
+PAUSA_MIN_ENTRE_LUGARES = 0.8
+
+
+def _politeness(last_ts, min_gap=PAUSA_MIN_ENTRE_LUGARES):
+    """Duerme solo lo que falte para que pasen min_gap segundos desde last_ts."""
+    espera = min_gap - (time.time() - last_ts)
+    if espera > 0:
+        time.sleep(espera)
+
 
 def procesar_lugar(driver, lugar, ultimas_reviews_db):
     """
@@ -187,129 +214,159 @@ def run_monitor():
     logger.info(f"📍 Lugares a monitorear: {len(lugares)}")
     logger.info("-" * 40)
     
-    # Crear driver
-    driver = None
-    try:
-        driver = crear_driver()
-        logger.info("✅ Driver de Chrome creado")
-    except Exception as e:
-        logger.error(f"❌ No se pudo crear el driver: {e}")
-        return
+    # Cola compartida: cada worker (un Chrome propio) toma el siguiente lugar
+    cola = queue.Queue()
+    for i, lugar in enumerate(lugares, 1):
+        cola.put((i, lugar))
     
-    # Contadores
+    # Contadores (compartidos entre workers)
     start_time = time.time()
-    procesados = 0
-    con_cambios = 0
-    total_nuevas_reviews = 0
-    errores = 0
-    errores_consecutivos = 0
-    timed_out = False
+    stats = {'procesados': 0, 'con_cambios': 0, 'nuevas_reviews': 0, 'errores': 0, 'timed_out': False}
+    stats_lock = threading.Lock()
     
-    try:
-        for i, lugar in enumerate(lugares, 1):
-            # Verificar tiempo
-            elapsed = time.time() - start_time
-            if elapsed >= MAX_RUNTIME_SECONDS:
-                logger.warning(f"⏰ Tiempo límite alcanzado ({MAX_RUNTIME_HOURS}h)")
-                timed_out = True
-                break
-            
-            nombre = lugar['nombre']
-            logger.info(f"[{i}/{len(lugares)}] {nombre[:50]}")
-            
-            # Obtener últimas 2 reviews para early-stop
-            ultimas_reviews = get_ultimas_N_reviews_restaurante(nombre, n=2)
-            
-            try:
-                # Procesar lugar
-                reviews, estado = procesar_lugar(driver, lugar, ultimas_reviews)
-                
-                # Registrar en review_history para el dashboard Monitor
-                # Esto se hace siempre que procesemos un lugar exitosamente
-                count_actual = lugar.get('last_count', 0) or 0
-                if reviews:
-                    count_actual = count_actual + len(reviews)
-                
-                delta = log_review_history(
-                    url=lugar['url'],
-                    current_count=count_actual,
-                    current_rating=None,  # Ya se actualizó en procesar_lugar
-                    nombre=nombre,
-                    direccion=lugar.get('direccion')
-                )
-                if delta and delta > 0:
-                    logger.info(f"   📊 Historial: +{delta} reviews")
+    def worker(n):
+        """Procesa lugares de la cola con su propio driver hasta vaciarla o agotar el tiempo."""
+        try:
+            driver = _crear_driver_serializado()
+            logger.info(f"✅ Driver de Chrome creado (worker {n})")
+        except Exception as e:
+            logger.error(f"❌ No se pudo crear el driver (worker {n}): {e}")
+            return
+        
+        usos = 0
+        errores_consecutivos = 0
+        ultima_navegacion = 0.0
+        try:
+            while True:
+                # Verificar tiempo
+                if time.time() - start_time >= MAX_RUNTIME_SECONDS:
+                    with stats_lock:
+                        if not stats['timed_out']:
+                            logger.warning(f"⏰ Tiempo límite alcanzado ({MAX_RUNTIME_HOURS}h)")
+                        stats['timed_out'] = True
+                    return
                 
-                if estado == 'NUEVAS_REVIEWS' and reviews:
-                    # Insertar reviews en DB
-                    insertadas, duplicadas = insertar_reviews_batch(reviews)
-                    total_nuevas_reviews += insertadas
-                    con_cambios += 1
-                    logger.info(f"   💾 Guardadas: {insertadas} | Duplicadas: {duplicadas}")
+                try:
+                    i, lugar = cola.get_nowait()
+                except queue.Empty:
+                    return
                 
-                # INTEGRACIÓN DASHBOARD: Loguear en scraping_logs para visualización histórica
-                estado_dash = "EXITO" 
-                if estado == 'ERROR': estado_dash = "ERROR_TEMPORAL"
-                elif estado == 'SIN_PESTANA': estado_dash = "SIN_OPINIONES"
+                nombre = lugar['nombre']
+                logger.info(f"[{i}/{len(lugares)}] {nombre[:50]}")
                 
-                nuevas_count_dash = len(reviews) if reviews else 0
+                # Obtener últimas 2 reviews para early-stop
+                ultimas_reviews = get_ultimas_N_reviews_restaurante(nombre, n=2)
                 
-                log_scraping_event(
-                    url=lugar['url'],
-                    estado=estado_dash,
-                    mensaje=f"Monitor: {estado} (+{nuevas_count_dash})",
-                    reviews_detectadas=count_actual,
-                    nuevas_reviews=nuevas_count_dash,
-                    intentos=1
-                )
+                try:
+                    # Procesar lugar (el driver.get va al principio de procesar_lugar)
+                    _politeness(ultima_navegacion)
+                    ultima_navegacion = time.time()
+                    reviews, estado = procesar_lugar(driver, lugar, ultimas_reviews)
+                    
+                    # Registrar en review_history para el dashboard Monitor
+                    # Esto se hace siempre que procesemos un lugar exitosamente
+                    count_actual = lugar.get('last_count', 0) or 0
+                    if reviews:
+                        count_actual = count_actual + len(reviews)
+                    
+                    delta = log_review_history(
+                        url=lugar['url'],
+                        current_count=count_actual,
+                        current_rating=None,  # Ya se actualizó en procesar_lugar
+                        nombre=nombre,
+                        direccion=lugar.get('direccion')
+                    )
+                    if delta and delta > 0:
+                        logger.info(f"   📊 Historial: +{delta} reviews")
+                    
+                    if estado == 'NUEVAS_REVIEWS' and reviews:
+                        # Insertar reviews en DB
+                        insertadas, duplicadas = insertar_reviews_batch(reviews)
+                        with stats_lock:
+                            stats['nuevas_reviews'] += insertadas
+                            stats['con_cambios'] += 1
+                        logger.info(f"   💾 Guardadas: {insertadas} | Duplicadas: {duplicadas}")
+                    
+                    # INTEGRACIÓN DASHBOARD: Loguear en scraping_logs para visualización histórica
+                    estado_dash = "EXITO" 
+                    if estado == 'ERROR': estado_dash = "ERROR_TEMPORAL"
+                    elif estado == 'SIN_PESTANA': estado_dash = "SIN_OPINIONES"
+                    
+                    nuevas_count_dash = len(reviews) if reviews else 0
+                    
+                    log_scraping_event(
+                        url=lugar['url'],
+                        estado=estado_dash,
+                        mensaje=f"Monitor: {estado} (+{nuevas_count_dash})",
+                        reviews_detectadas=count_actual,
+                        nuevas_reviews=nuevas_count_dash,
+                        intentos=1
+                    )
 
-                procesados += 1
-                errores_consecutivos = 0
-                
-            except Exception as e:
-                errores += 1
-                errores_consecutivos += 1
-                error_msg = str(e)[:200]
-                logger.error(f"   ❌ Error procesando: {error_msg}")
-                
-                # Loguear ERROR en DB también
-                log_scraping_event(
-                    url=lugar['url'],
-                    estado="ERROR",
-                    mensaje=f"Monitor Error: {error_msg}",
-                    reviews_detectadas=0,
-                    nuevas_reviews=0,
-                    intentos=1
-                )
+                    with stats_lock:
+                        stats['procesados'] += 1
+                    errores_consecutivos = 0
+                    
+                except Exception as e:
+                    with stats_lock:
+                        stats['errores'] += 1
+                    errores_consecutivos += 1
+                    error_msg = str(e)[:200]
+                    logger.error(f"   ❌ Error procesando: {error_msg}")
+                    
+                    # Loguear ERROR en DB también
+                    log_scraping_event(
+                        url=lugar['url'],
+                        estado="ERROR",
+                        mensaje=f"Monitor Error: {error_msg}",
+                        reviews_detectadas=0,
+                        nuevas_reviews=0,
+                        intentos=1
+                    )
+                    
+                    # Si hay muchos errores seguidos, reiniciar driver
+                    if errores_consecutivos >= 3:
+                        logger.warning(f"⚠️ 3 errores consecutivos, reiniciando driver (worker {n})...")
+                        try:
+                            driver.quit()
+                        except:
+                            pass
+                        driver = _crear_driver_serializado()
+                        errores_consecutivos = 0
                 
-                # Si hay muchos errores seguidos, reiniciar driver
-                if errores_consecutivos >= 3:
-                    logger.warning("⚠️ 3 errores consecutivos, reiniciando driver...")
+                # Reinicio preventivo cada 50 lugares (por worker)
+                usos += 1
+                if usos % 50 == 0:
+                    logger.info(f"♻️ Reinicio preventivo del driver (worker {n})...")
                     try:
                         driver.quit()
                     except:
                         pass
-                    driver = crear_driver()
-                    errores_consecutivos = 0
-            
-            # Pausa entre lugares
-            time.sleep(1.5)
-            
-            # Reinicio preventivo cada 50 lugares
-            if i % 50 == 0:
-                logger.info("♻️ Reinicio preventivo del driver...")
+                    driver = _crear_driver_serializado()
+        finally:
+            try:
+                driver.quit()
+            except:
+                pass
+    
+    logger.info(f"🧵 Workers en paralelo: {MONITOR_WORKERS}")
+    try:
+        with ThreadPoolExecutor(max_workers=MONITOR_WORKERS) as executor:
+            for futuro in [executor.submit(worker, n) for n in range(1, MONITOR_WORKERS + 1)]:
                 try:
-                    driver.quit()
-                except:
-                    pass
-                driver = crear_driver()
+                    futuro.result()
+                except Exception as e:
+                    logger.error(f"❌ Worker terminado con error: {e}")
                 
     finally:
-        # Cerrar driver
-        try:
-            driver.quit()
-        except:
-            pass
+        # Liberar los lugares reclamados (los pendientes vuelven a la cola)
+        liberar_lugares_monitoreo([l['url'] for l in lugares])
+        
+        procesados = stats['procesados']
+        con_cambios = stats['con_cambios']
+        total_nuevas_reviews = stats['nuevas_reviews']
+        errores = stats['errores']
+        timed_out = stats['timed_out']
         
         # Cerrar conexión DB
         close_connection()
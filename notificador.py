@@ -3,8 +3,10 @@ import json
 import csv
 import datetime
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 import argparse
+from collections import Counter
 import re
 import sys
 
@@ -25,32 +27,52 @@ ARCHIVO_RESUMEN = "resumen_run.json"
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Sesión HTTP del proceso: los envíos a Discord reusan la conexión TLS (keep-alive)
+_HTTP_SESSION = None
+
+
+def _get_http_session():
+    """Devuelve la sesión HTTP del proceso para el webhook de Discord."""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        # Sin reintentos automáticos: reenviar un POST al webhook duplicaría el mensaje
+        _HTTP_SESSION = requests.Session()
+        _HTTP_SESSION.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+    return _HTTP_SESSION
+
 
 def contar_lineas_csv(archivo):
-    """Cuenta las líneas de un CSV (excluyendo header)"""
+    """
+    Cuenta las líneas de un CSV (excluyendo header). Cuenta saltos de línea en
+    binario, sin decodificar ni parsear: los CSV de lugares no tienen campos
+    con saltos de línea embebidos.
+    """
     if not os.path.exists(archivo):
         return 0
     try:
-        with open(archivo, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            next(reader, None)  # Skip header
-            return sum(1 for _ in reader)
+        lineas = 0
+        ultimo = b'\n'
+        with open(archivo, 'rb') as f:
+            for bloque in iter(lambda: f.read(1 << 20), b''):
+                lineas += bloque.count(b'\n')
+                ultimo = bloque[-1:]
+        if ultimo != b'\n':
+            lineas += 1  # Última línea sin salto final
+        return max(lineas - 1, 0)  # Skip header
     except:
         return 0
 
 
 def obtener_reviews_por_lugar():
     """Obtiene conteo de reseñas por lugar"""
-    reviews_por_lugar = {}
+    reviews_por_lugar = Counter()
     if not os.path.exists(ARCHIVO_REVIEWS):
         return reviews_por_lugar
     
     try:
         with open(ARCHIVO_REVIEWS, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
-            for row in reader:
-                nombre = row.get('restaurante', 'Desconocido')
-                reviews_por_lugar[nombre] = reviews_por_lugar.get(nombre, 0) + 1
+            reviews_por_lugar.update(row.get('restaurante', 'Desconocido') for row in reader)
     except:
         pass
     
@@ -67,9 +89,7 @@ def obtener_estado_reviews():
     try:
         with open(ARCHIVO_ESTADO_REVIEWS, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
-            for row in reader:
-                estado = row.get('estado', 'PENDIENTE')
-                estados[estado] = estados.get(estado, 0) + 1
+            estados.update(Counter(row.get('estado', 'PENDIENTE') for row in reader))
     except:
         pass
     
@@ -117,7 +137,7 @@ def enviar_discord(mensaje, color=0x00ff00, dry_run=False):
         return False
     
     try:
-        response = requests.post(DISCORD_WEBHOOK_URL, json=payload, timeout=10)
+        response = _get_http_session().post(DISCORD_WEBHOOK_URL, json=payload, timeout=10)
         if response.status_code in [200, 204]:
             logger.info("✓ Mensaje enviado a Discord")
             return True
@@ -30,13 +30,16 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME", "reviews_embeddings")
 DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
 
+# Lugares que se acumulan antes de pedir sus resúmenes en paralelo a DeepSeek
+LOTE_RESUMENES = 16
+
 # Importar utilidades
 from db_utils import (
-    get_connection, close_connection, migrate_embedding_columns,
+    close_connection, borrow_conn, migrate_embedding_columns,
     get_lugares_para_embedding, get_reviews_nuevas_sin_embedding,
     get_todas_reviews_lugar, actualizar_resumen_lugar
 )
-from deepseek_utils import generar_resumen_reviews, detectar_info_nueva, limpiar_texto
+from deepseek_utils import generar_resumenes_batch, detectar_info_nueva, limpiar_texto
 
 
 def get_sqlalchemy_url(url):
@@ -83,6 +86,17 @@ def delete_all_embeddings(engine):
         return result.rowcount
 
 
+def resumir_pendientes(pendientes):
+    """
+    Genera en paralelo los resúmenes de una lista de (lugar, reviews) y la vacía.
+    Devuelve [(lugar, resumen)] solo para los que se obtuvo resumen.
+    """
+    resumenes = generar_resumenes_batch([(lugar['nombre'], reviews) for lugar, reviews in pendientes])
+    resultado = [(lugar, resumen) for (lugar, _), resumen in zip(pendientes, resumenes) if resumen]
+    pendientes.clear()
+    return resultado
+
+
 def create_document(lugar, resumen):
     """Crea un Document de LangChain para un lugar"""
     # Si es el mensaje genérico de falta de info, NO generar embedding
@@ -165,6 +179,19 @@ def regenerate_full(resume=False):
     skipped_count = 0
     
     limit_date = datetime.now() - timedelta(hours=24)
+    pendientes = []
+    
+    def guardar_resumenes():
+        nonlocal resumenes_count
+        for lugar_ok, resumen in resumir_pendientes(pendientes):
+            resumenes_count += 1
+            # Guardar resumen en DB
+            actualizar_resumen_lugar(lugar_ok['nombre'], resumen)
+            
+            # Crear documento para embedding
+            doc = create_document(lugar_ok, resumen)
+            if doc:
+                docs.append(doc)
     
     for i, lugar in enumerate(lugares):
         nombre = lugar['nombre']
@@ -195,24 +222,18 @@ def regenerate_full(resume=False):
         if not reviews:
             continue
         
-        # Generar resumen con DeepSeek
+        # Generar resumen con DeepSeek (en lotes paralelos)
         logger.info(f"[{i+1}/{len(lugares)}] {nombre[:40]}... ({len(reviews)} reviews)")
-        resumen = generar_resumen_reviews(reviews, nombre)
-        
-        if resumen:
-            resumenes_count += 1
-            # Guardar resumen en DB
-            actualizar_resumen_lugar(nombre, resumen)
-            
-            # Crear documento para embedding
-            doc = create_document(lugar, resumen)
-            if doc:
-                docs.append(doc)
+        pendientes.append((lugar, reviews))
+        if len(pendientes) >= LOTE_RESUMENES:
+            guardar_resumenes()
         
         # Log de progreso
         if (i + 1) % 50 == 0:
             logger.info(f"   ⏳ Progreso: {i+1}/{len(lugares)}")
     
+    guardar_resumenes()
+    
     # Generar embeddings
     embeddings_count = 0
     if docs:
@@ -261,6 +282,14 @@ def regenerate_incremental():
     
     lugares_a_actualizar = []
     nuevos_resumenes = {}
+    pendientes = []
+    
+    def encolar_resumen(lugar, reviews):
+        pendientes.append((lugar, reviews))
+        if len(pendientes) >= LOTE_RESUMENES:
+            for lugar_ok, resumen in resumir_pendientes(pendientes):
+                nuevos_resumenes[lugar_ok['nombre']] = resumen
+                lugares_a_actualizar.append(lugar_ok)
     
     for i, lugar in enumerate(lugares):
         nombre = lugar['nombre']
@@ -272,10 +301,7 @@ def regenerate_incremental():
             reviews = get_todas_reviews_lugar(nombre)
             if reviews:
                 logger.info(f"[NUEVO] {nombre[:40]}...")
-                resumen = generar_resumen_reviews(reviews, nombre)
-                if resumen:
-                    nuevos_resumenes[nombre] = resumen
-                    lugares_a_actualizar.append(lugar)
+                encolar_resumen(lugar, reviews)
             continue
         
         # Caso 2: Tiene resumen → verificar si hay reviews nuevas QUALIFICADAS
@@ -302,15 +328,17 @@ def regenerate_incremental():
         if detectar_info_nueva(resumen_actual, reviews_validas):
             # Regenerar resumen completo
             todas_reviews = get_todas_reviews_lugar(nombre) # Devuelve dicts con rating
-            resumen = generar_resumen_reviews(todas_reviews, nombre)
-            if resumen:
-                nuevos_resumenes[nombre] = resumen
-                lugares_a_actualizar.append(lugar)
-                logger.info(f"   ✅ Info nueva detectada, regenerando")
+            encolar_resumen(lugar, todas_reviews)
+            logger.info(f"   ✅ Info nueva detectada, regenerando")
         else:
             logger.info(f"   ⏭️ Sin info nueva relevante, actualizando solo timestamp")
             actualizar_resumen_lugar(nombre, resumen_actual) # Actualiza solo fecha
     
+    # Resúmenes que quedaron en el último lote
+    for lugar_ok, resumen in resumir_pendientes(pendientes):
+        nuevos_resumenes[lugar_ok['nombre']] = resumen
+        lugares_a_actualizar.append(lugar_ok)
+    
     logger.info(f"\n📊 Lugares a actualizar: {len(lugares_a_actualizar)}")
     
     # Enviar reporte si NO hubo cambios (para saber que corrió)
@@ -387,10 +415,12 @@ def regenerate_embeddings_only():
     engine = create_engine(get_sqlalchemy_url(DATABASE_URL))
     
     # Obtener lugares que YA tienen resumen
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT nombre, rating_gral, direccion, zona, barrio, categoria, resumen_reviews FROM lugares WHERE resumen_reviews IS NOT NULL AND length(resumen_reviews) > 20")
-    rows = cursor.fetchall()
+    # Conexión prestada del pool solo para esta consulta
+    with borrow_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT nombre, rating_gral, direccion, zona, barrio, categoria, resumen_reviews FROM lugares WHERE resumen_reviews IS NOT NULL AND length(resumen_reviews) > 20")
+        rows = cursor.fetchall()
+        cursor.close()
     
     lugares_con_resumen = []
     for r in rows:
@@ -403,7 +433,6 @@ def regenerate_embeddings_only():
             'categoria': r[5],
             'resumen_reviews': r[6]
         })
-    conn.close()
     
     logger.info(f"📍 Lugares con resumen apto: {len(lugares_con_resumen)}")
     
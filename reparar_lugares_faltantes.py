@@ -1,20 +1,48 @@
 import pandas as pd
 import logging
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 from db_utils import upsert_lugar
-from geo_utils import extraer_coordenadas_url, asignar_barrio
-from monitor_reviews import extraer_metricas_rapido, setup_driver 
+from geo_utils import extraer_coordenadas_url, asignar_barrios_batch
+from scraping_utils import crear_driver, detectar_total_reviews, extraer_rating_page
 
-# Se reusa setup_driver de monitor_reviews que ya tiene headless y opciones correctas
-# Se reusa extraer_metricas_rapido para obtener count y rating
+# Se reusa crear_driver de scraping_utils que ya tiene headless y opciones correctas
+# Se reusan detectar_total_reviews / extraer_rating_page para obtener count y rating
 # Se reusa upsert_lugar para insertar en DB
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def extraer_metricas_rapido(driver, url):
+    """
+    Abre la ficha del lugar (en español) y retorna (count, rating).
+    Misma carga que monitor_reviews.procesar_lugar.
+    """
+    url_es = url.replace('hl=en', 'hl=es')
+    if 'hl=' not in url_es:
+        url_es += ('&' if '?' in url_es else '?') + 'hl=es'
+    
+    driver.get(url_es)
+    
+    # Esperar carga completa (h1 + div.F7nice con el conteo)
+    try:
+        WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.TAG_NAME, "h1")))
+        WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.F7nice")))
+    except Exception:
+        # Si no carga, refrescar y reintentar
+        driver.refresh()
+        time.sleep(3)
+        try:
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.F7nice")))
+        except Exception:
+            pass
+    
+    time.sleep(2)  # Espera adicional para carga completa
+    
+    return detectar_total_reviews(driver), extraer_rating_page(driver)
+
 def reparar_lugares(csv_path):
     """
     Lee validacion_reviews.csv, filtra los lugares con problemas (0 reviews reales o diferencia negativa significativa),
@@ -44,30 +72,27 @@ def reparar_lugares(csv_path):
 
     logger.info(f"Encontrados {len(candidatos)} lugares faltantes para reparar.")
     
-    driver = setup_driver()
+    # Las coordenadas salen de la URL: resolver todos los barrios de una vez
+    coords = [extraer_coordenadas_url(url) for url in candidatos['url']]
+    barrios = asignar_barrios_batch([lat for lat, _ in coords], [lon for _, lon in coords])
+    
+    driver = crear_driver()
     
     procesados = 0
     errores = 0
     
     try:
-        for idx, row in candidatos.iterrows():
-            url = row['url']
-            nombre_reportado = row['nombre']
-            
+        # Tuplas planas (sin construir una Series por fila como iterrows)
+        for pos, (idx, url, nombre_reportado) in enumerate(candidatos[['url', 'nombre']].itertuples(name=None)):
             logger.info(f"Reparando ({idx+1}/{len(candidatos)}): {nombre_reportado}")
             
             try:
                 # 1. Extraer métricas actuales (Rating, Count)
                 count, rating = extraer_metricas_rapido(driver, url)
                 
-                # 2. Extraer Geo
-                lat, lon = extraer_coordenadas_url(url)
-                barrio_info = {}
-                if lat and lon:
-                    try:
-                        barrio_info = asignar_barrio(lat, lon)
-                    except:
-                        pass
+                # 2. Geo (precalculado en lote)
+                lat, lon = coords[pos]
+                barrio_info = barrios[pos] if lat and lon else {}
                 
                 # 3. Construir objeto lugar
                 # No tenemos categoría ni dirección exacta desde 'extraer_metricas_rapido', 
@@ -26,6 +26,16 @@ USER_AGENTS = [
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 ]
 
+# Recursos que no aportan datos (fotos, tiles del mapa, fuentes, video): se
+# descartan en la capa de red vía CDP. El CSS se deja pasar: sin él cambia el
+# layout y fallan los clicks/scroll del panel de reseñas.
+URLS_BLOQUEADAS = [
+    "*.png", "*.jpg", "*.jpeg", "*.webp", "*.gif",
+    "*.woff", "*.woff2", "*.mp4",
+    "*googleusercontent.com/*=w*",
+    "*/maps/vt*",
+]
+
 
 # ==========================================
 # FUNCIONES DE DRIVER
@@ -43,9 +53,18 @@ def crear_driver(headless=True, window_height=4000):
     options.add_argument("--lang=es-AR")
     options.add_argument("--log-level=3")
     options.add_argument(f"user-agent={random.choice(USER_AGENTS)}")
+    # No descargar imágenes (las estrellas son span role=img con aria-label, no <img>)
+    options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
     
     driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
     driver.set_page_load_timeout(60)
+    
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": URLS_BLOQUEADAS})
+    except Exception as e:
+        logger.warning(f"No se pudo configurar el bloqueo de recursos vía CDP: {e}")
+    
     return driver
 
 
@@ -170,6 +189,12 @@ def ordenar_por_recientes(driver):
     return False
 
 
+_RE_COUNT_PAREN = re.compile(r'\(([\d\.]+)\)')
+_RE_NUMS = re.compile(r'[\d\.]+')
+_RE_SOLO_COUNT = re.compile(r'^\([\d\.]+\)$')
+_RE_TOTAL = re.compile(r'([\d.,]+)')
+
+
 def detectar_total_reviews(driver):
     """Detecta cantidad total de reseñas desde la página con múltiples métodos"""
     
@@ -177,7 +202,7 @@ def detectar_total_reviews(driver):
     try:
         header = driver.find_element(By.CSS_SELECTOR, "div.F7nice")
         text = header.text  # "4,1\n(5.101)" o similar
-        count_match = re.search(r'\(([\d\.]+)\)', text)
+        count_match = _RE_COUNT_PAREN.search(text)
         if count_match:
             raw_num = count_match.group(1).replace('.', '').replace(',', '')
             if raw_num.isdigit():
@@ -190,7 +215,7 @@ def detectar_total_reviews(driver):
         botones = driver.find_elements(By.CSS_SELECTOR, "button[aria-label*='opiniones'], button[aria-label*='reviews'], button[aria-label*='reseñas']")
         for btn in botones:
             lbl = btn.get_attribute("aria-label") or ""
-            nums = re.findall(r'[\d\.]+', lbl)
+            nums = _RE_NUMS.findall(lbl)
             if nums:
                 candidatos = [int(n.replace('.', '').replace(',', '')) for n in nums if n.replace('.', '').replace(',', '').isdigit()]
                 if candidatos:
@@ -203,7 +228,7 @@ def detectar_total_reviews(driver):
         spans = driver.find_elements(By.TAG_NAME, "span")
         for span in spans:
             text = span.text.strip()
-            if re.match(r'^\([\d\.]+\)$', text):
+            if _RE_SOLO_COUNT.match(text):
                 num = text.strip('()').replace('.', '')
                 if num.isdigit():
                     return int(num)
@@ -214,7 +239,7 @@ def detectar_total_reviews(driver):
     try:
         score = driver.find_element(By.XPATH, "//div[contains(@class, 'fontDisplayLarge')]")
         total_txt = score.find_element(By.XPATH, "..").find_element(By.CLASS_NAME, "fontBodySmall").text
-        clean = re.search(r'([\d.,]+)', total_txt).group(1).replace('.', '').replace(',', '')
+        clean = _RE_TOTAL.search(total_txt).group(1).replace('.', '').replace(',', '')
         if clean.isdigit():
             return int(clean)
     except:
@@ -249,6 +274,10 @@ def extraer_rating_page(driver):
 # FUNCIONES DE EXTRACCIÓN DE DATOS
 # ==========================================
 
+_RE_ENTERO = re.compile(r'(\d+)')
+_RE_RATING_USER = re.compile(r'(\d+[.,]?\d*)')
+
+
 def parsear_fecha_relativa(fecha_texto):
     """
     Convierte fechas relativas de Google Maps a fechas absolutas aproximadas.
@@ -268,7 +297,7 @@ def parsear_fecha_relativa(fecha_texto):
         'once': 11, 'doce': 12
     }
     
-    match_num = re.search(r'(\d+)', fecha_lower)
+    match_num = _RE_ENTERO.search(fecha_lower)
     if match_num:
         cantidad = int(match_num.group(1))
     else:
@@ -385,7 +414,7 @@ def extraer_reviews_de_pagina(driver, url, metadata, ultimas_reviews_db=None):
         for tag in tags_img:
             lbl = (tag.get('aria-label') or "").lower()
             if 'estrella' in lbl or 'star' in lbl:
-                match = re.search(r'(\d+[.,]?\d*)', lbl)
+                match = _RE_RATING_USER.search(lbl)
                 if match:
                     try: 
                         row['rating_user'] = float(match.group(1).replace(',', '.'))
@@ -445,10 +474,13 @@ def scroll_para_cargar_reviews(driver, target, tiempo_limite_segundos=180):
     return len(driver.find_elements(By.CSS_SELECTOR, "div.jftiEf"))
 
 
+_RE_COORDS_AT = re.compile(r'@(-?\d+\.\d+),(-?\d+\.\d+)')
+
+
 def extraer_coordenadas_url(url):
     """Extrae latitud y longitud de una URL de Google Maps"""
     try:
-        match = re.search(r'@(-?\d+\.\d+),(-?\d+\.\d+)', url)
+        match = _RE_COORDS_AT.search(url)
         if match:
             return float(match.group(1)), float(match.group(2))
     except:
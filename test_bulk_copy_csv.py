@@ -0,0 +1,39 @@
+"""
+Test del CSV que bulk_insert_reviews envía a COPY (sin base de datos).
+
+Uso: python -m unittest test_bulk_copy_csv
+"""
+import unittest
+
+from db_utils import _csv_copy_reviews
+
+
+class TestCsvCopyReviews(unittest.TestCase):
+
+    def test_none_viaja_como_null_y_vacio_como_texto(self):
+        review = {
+            'restaurante': 'La Toscana',
+            'autor': '',
+            'rating_user': None,
+            'texto': 'Muy rico, volvería',
+            'fecha_aproximada': None,
+            'fecha_original': None,
+            'fecha_scraping': '2026-10-16T12:00:00',
+            'review_id': 'abc123'
+        }
+        linea = _csv_copy_reviews([review]).getvalue()
+
+        # Numérico y fechas en None: \N sin comillas (NULL para COPY ... NULL '\N');
+        # autor '' queda como campo vacío (texto vacío, no NULL)
+        self.assertEqual(
+            linea,
+            'La Toscana,,\\N,"Muy rico, volvería",\\N,\\N,2026-10-16T12:00:00,abc123\r\n'
+        )
+
+    def test_rating_numerico(self):
+        linea = _csv_copy_reviews([{'restaurante': 'X', 'rating_user': 4.5, 'fecha_scraping': 'f'}]).getvalue()
+        self.assertEqual(linea, 'X,Anónimo,4.5,,\\N,\\N,f,\r\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Test de flush_logs cuando no se puede guardar (sin base de datos).
+
+Uso: python -m unittest test_flush_logs
+"""
+import unittest
+from collections import deque
+from contextlib import contextmanager
+from unittest import mock
+
+import db_utils
+
+
+def _evento(n):
+    return (float(n), f"url{n}", 'EXITO', '', 0, 0, 1)
+
+
+@contextmanager
+def _sin_conexion():
+    yield None
+
+
+class _ConexionSinCursor:
+    def cursor(self):
+        raise RuntimeError("conexión cerrada")
+
+
+class TestFlushLogs(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = deque(maxlen=5)
+        parche = mock.patch.object(db_utils, '_log_buffer', self.buffer)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_sin_conexion_reencola(self):
+        self.buffer.extend([_evento(1), _evento(2)])
+        with mock.patch.object(db_utils, 'borrow_conn', _sin_conexion):
+            self.assertFalse(db_utils.flush_logs())
+        self.assertEqual(list(self.buffer), [_evento(1), _evento(2)])
+
+    def test_falla_al_crear_cursor(self):
+        @contextmanager
+        def _conexion_rota():
+            yield _ConexionSinCursor()
+
+        self.buffer.append(_evento(1))
+        with mock.patch.object(db_utils, 'borrow_conn', _conexion_rota):
+            self.assertFalse(db_utils.flush_logs())
+        self.assertEqual(list(self.buffer), [_evento(1)])
+
+    def test_reencolar_con_buffer_lleno_conserva_los_nuevos(self):
+        # Llegaron eventos nuevos mientras fallaba el volcado de los pendientes
+        self.buffer.extend([_evento(n) for n in (10, 11, 12)])
+        with self.assertLogs(db_utils.logger, level='WARNING'):
+            db_utils._reencolar_logs([_evento(n) for n in (1, 2, 3, 4)])
+        # Entran 2 de 4 pendientes (los más recientes) y no se pierde ningún nuevo
+        self.assertEqual(list(self.buffer), [_evento(n) for n in (3, 4, 10, 11, 12)])
+
+
+if __name__ == "__main__":
+    unittest.main()
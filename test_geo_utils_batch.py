@@ -0,0 +1,62 @@
+"""
+Test de asignar_barrios_batch contra asignar_barrio punto a punto (sin red:
+mapa de barrios sintético).
+
+Uso: python -m unittest test_geo_utils_batch
+"""
+import unittest
+
+try:
+    import geopandas as gpd
+    from shapely.geometry import box
+    import geo_utils
+except ImportError:
+    geo_utils = None
+
+
+@unittest.skipUnless(geo_utils is not None, "requiere geopandas/shapely")
+class TestAsignarBarriosBatch(unittest.TestCase):
+
+    def setUp(self):
+        # Dos barrios contiguos y un tercero superpuesto al primero (gana el primero)
+        self._gdf_original = geo_utils._GDF_BARRIOS
+        geo_utils._GDF_BARRIOS = gpd.GeoDataFrame(
+            {'barrio_oficial': ['Centro Este', 'Santa Genoveva', 'Superpuesto']},
+            geometry=[
+                box(-68.07, -38.96, -68.05, -38.94),
+                box(-68.05, -38.96, -68.03, -38.94),
+                box(-68.06, -38.95, -68.04, -38.93),
+            ],
+            crs='EPSG:4326'
+        )
+        geo_utils._barrio_de_punto.cache_clear()
+
+    def tearDown(self):
+        geo_utils._GDF_BARRIOS = self._gdf_original
+        geo_utils._barrio_de_punto.cache_clear()
+
+    def test_batch_coincide_con_punto_a_punto(self):
+        puntos = [
+            (-38.95, -68.06),   # Centro Este
+            (-38.95, -68.04),   # Santa Genoveva
+            (-38.945, -68.055), # Centro Este y Superpuesto
+            (-38.935, -68.045), # solo Superpuesto
+            (-38.90, -68.10),   # fuera de todos
+            (None, -68.06),     # sin coordenadas
+            (-38.95, None),
+        ]
+        lats = [lat for lat, _ in puntos]
+        lons = [lon for _, lon in puntos]
+
+        esperado = [geo_utils.asignar_barrio(lat, lon) for lat, lon in puntos]
+        self.assertEqual(geo_utils.asignar_barrios_batch(lats, lons), esperado)
+        self.assertEqual(esperado[0]['barrio'], 'Centro Este')
+        self.assertEqual(esperado[2]['barrio'], 'Centro Este')
+        self.assertIsNone(esperado[4]['barrio'])
+
+    def test_lista_vacia(self):
+        self.assertEqual(geo_utils.asignar_barrios_batch([], []), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,7 @@ import json
 import argparse
 import os
 from datetime import datetime
-from db_utils import get_connection, log_validation_report, ensure_log_tables_exists
+from db_utils import get_connection, close_connection, log_validation_report, ensure_log_tables_exists
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -109,7 +109,7 @@ def validar_db(export_csv=True):
         sys.exit(1)
     finally:
         cursor.close()
-        conn.close()
+        close_connection()
 
 if __name__ == "__main__":
     validar_db()